@@ -1,10 +1,12 @@
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, render_template, request, jsonify
+import atexit
 import json
 import os
 import sys
 
 # Import models and blueprints
 from models import init_db
+from models.database import close_all_connections
 from blueprints.customer import customer_bp
 from blueprints.layout import layout_bp
 from blueprints.font import font_bp
@@ -12,12 +14,31 @@ from blueprints.order import order_bp
 
 app = Flask(__name__)
 
-# Ensure .tmp and fonts directories exist
-os.makedirs('.tmp', exist_ok=True)
-os.makedirs('fonts', exist_ok=True)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tools'))
+from artifact_store import artifacts, send_artifact
 
-# Initialize database
-init_db()
+
+def init_app():
+    """Start-up side effects of the server process (directories, database, sweeper)"""
+    # Ensure .tmp and fonts directories exist
+    os.makedirs('.tmp', exist_ok=True)
+    os.makedirs('fonts', exist_ok=True)
+
+    # Exports are one-shot downloads in the .tmp artifact store, deleted once sent;
+    # the sweeper enforces its size cap and TTL for anything left behind
+    artifacts.start_sweeper()
+
+    # Initialize database
+    init_db()
+    atexit.register(close_all_connections)
+
+
+# Runs on every import of the app (py app.py, flask run, WSGI servers, test
+# clients) except in parallel PDF export workers: spawn re-imports this
+# module there as __mp_main__, and they must not migrate the database or
+# start sweepers of their own
+if __name__ != '__mp_main__':
+    init_app()
 
 # Register blueprints
 app.register_blueprint(customer_bp)
@@ -37,12 +58,45 @@ def export_pdf():
         # Import export tool
         sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tools'))
         from export_pdf import export_pdf as generate_pdf
+        from output_profile import resolve_profile
+
+        try:
+            profile = resolve_profile(data.get('outputProfile'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         # Generate PDF
-        filepath = generate_pdf(data)
+        filepath = generate_pdf(data, profile)
+
+        return send_artifact(filepath, as_attachment=True, download_name='export.pdf')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/export/pdf/batch', methods=['POST'])
+def export_pdf_batch():
+    try:
+        data = request.get_json()
+        pages = data.get('pages', [])
+        workers = data.get('workers')
+
+        if not pages:
+            return jsonify({'error': 'No pages provided'}), 400
+
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'tools'))
+        from export_pdf import export_pdf_batch as generate_pdf_batch
+        from output_profile import resolve_profile
 
-        return send_file(filepath, as_attachment=True, download_name='export.pdf')
+        try:
+            profile = resolve_profile(data.get('outputProfile'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        filepath = generate_pdf_batch(pages, workers=int(workers) if workers else None, profile=profile)
+
+        return send_artifact(filepath, as_attachment=True, download_name='export_all.pdf')
     except Exception as e:
+        import traceback
+        traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
 @app.route('/export/ai', methods=['POST'])
@@ -72,11 +126,17 @@ def export_ai():
         import export_ai as _export_ai_mod
         importlib.reload(_export_ai_mod)
         generate_ai = _export_ai_mod.export_ai
+        from output_profile import resolve_profile
+
+        try:
+            profile = resolve_profile(data.get('outputProfile'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         # Generate AI file (data already contains separateInvisible)
-        filepath = generate_ai(data, outlined)
+        filepath = generate_ai(data, outlined, profile)
 
-        return send_file(filepath, as_attachment=True, download_name='export.ai')
+        return send_artifact(filepath, as_attachment=True, download_name='export.ai')
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -100,10 +160,16 @@ def export_ai_batch():
         import importlib
         import export_ai as _export_ai_mod
         importlib.reload(_export_ai_mod)
+        from output_profile import resolve_profile
+
+        try:
+            profile = resolve_profile(data.get('outputProfile'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        filepath = _export_ai_mod.export_ai_batch(pages, outlined)
+        filepath = _export_ai_mod.export_ai_batch(pages, outlined, profile)
 
-        return send_file(filepath, as_attachment=True, download_name='export_all.ai')
+        return send_artifact(filepath, as_attachment=True, download_name='export_all.ai')
     except Exception as e:
         import traceback
         traceback.print_exc()
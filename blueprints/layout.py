@@ -1,9 +1,17 @@
 """Layout blueprint for layout management routes"""
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, send_file, abort
 from models.layout import Layout
+from models.layout_cache import layout_cache
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tools'))
 
 layout_bp = Blueprint('layout', __name__, url_prefix='/layout')
 
+MAX_PAGE_SIZE = 500
+
+# Thumbnails are addressed by immutable version hash: let browsers keep them
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
 @layout_bp.route('/create/draw', methods=['GET'])
 def create_draw_page():
     """Render draw tool page (placeholder)"""
@@ -38,10 +46,19 @@ def save_layout():
             data=data.get('data'),
             customer_id=data.get('customer_id')
         )
+        _schedule_thumbnail(layout_id)
         return jsonify({'success': True, 'id': layout_id}), 201
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def _schedule_thumbnail(layout_id):
+    """Queue a background render of the layout's new version; never fails the save"""
+    try:
+        from thumbnail import schedule
+        schedule(layout_id)
+    except Exception as e:
+        print(f"Warning: Could not schedule thumbnail: {e}")
+
 @layout_bp.route('/check-duplicate', methods=['POST'])
 def check_duplicate():
     """Check if a layout with the same customer+name already exists"""
@@ -64,21 +81,43 @@ def view_page():
 
 @layout_bp.route('/list', methods=['GET'])
 def list_layouts():
-    """Get all layouts as JSON with customer information"""
+    """List layout metadata with customer names.
+
+    Optional query params: customer_id, type, limit (page size, max 500) and
+    cursor (next_cursor from the previous page). Without limit all layouts
+    are returned.
+    """
     try:
-        layouts = Layout.get_all()
-        # Add customer name for each layout
-        for layout in layouts:
-            if layout.get('customer_id'):
-                from models.customer import Customer
-                customer = Customer.get_by_id(layout['customer_id'])
-                layout['customer_name'] = customer['company_name'] if customer else None
-            else:
-                layout['customer_name'] = None
-        return jsonify({'success': True, 'layouts': layouts}), 200
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+        layouts, next_cursor = Layout.list_summaries(
+            customer_id=request.args.get('customer_id') or None,
+            layout_type=request.args.get('type') or None,
+            limit=limit,
+            cursor=request.args.get('cursor', type=int)
+        )
+        return jsonify({'success': True, 'layouts': layouts, 'next_cursor': next_cursor}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@layout_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Parsed-layout cache hit/miss statistics"""
+    return jsonify({'success': True, 'stats': layout_cache.stats()}), 200
+
+@layout_bp.route('/thumbnail/<version_hash>.svg', methods=['GET'])
+def get_thumbnail(version_hash):
+    """SVG thumbnail of a layout version (rendered on first request if not saved yet)"""
+    from thumbnail import get_thumbnail as render_thumbnail
+    path = render_thumbnail(version_hash)
+    if path is None:
+        abort(404)
+    response = send_file(path, mimetype='image/svg+xml', max_age=THUMBNAIL_MAX_AGE, etag=version_hash)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @layout_bp.route('/<layout_id>', methods=['GET'])
 def get_layout(layout_id):
     """Get layout details"""
@@ -102,6 +141,8 @@ def update_layout(layout_id):
             data=data.get('data'),
             customer_id=data.get('customer_id')
         )
+        if data.get('data'):
+            _schedule_thumbnail(layout_id)
         return jsonify({'success': True}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -1,9 +1,11 @@
-from flask import Blueprint, render_template, request, jsonify, send_file
+from flask import Blueprint, render_template, request, jsonify, Response, stream_with_context
 from models.order import Order
-from models.database import execute_query
+from models.layout import Layout
 import sys, os, json
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tools'))
-from excel_order import generate_template, generate_dummy, parse_upload
+from artifact_store import send_artifact
+from excel_order import (generate_template, generate_dummy, parse_upload, open_upload, upload_extension,
+                         UploadSummary, UploadError, UPLOAD_EXTENSIONS)
 
 order_bp = Blueprint('order', __name__, url_prefix='/order')
 
@@ -33,20 +35,37 @@ def api_create():
     if not customer_id or not po_number or not lines:
         return jsonify({'error': 'Missing required fields'}), 400
 
+    checked = []
+    for i, line in enumerate(lines, start=1):
+        layout_id = _positive_int(line.get('layout_id')) if isinstance(line, dict) else None
+        if layout_id is None:
+            return jsonify({'error': f'Invalid layout_id in line {i}'}), 400
+        quantity = _positive_int(line.get('quantity'))
+        if quantity is None:
+            return jsonify({'error': f"Quantity must be a whole number >= 1 in line {i}: {line.get('quantity')}"}), 400
+        checked.append(dict(line, layout_id=layout_id, quantity=quantity))
+    lines = checked
+
     try:
-        order_id = Order.create(customer_id, po_number)
-        for line in lines:
-            Order.add_line(
-                order_id,
-                line['layout_id'],
-                line['quantity'],
-                line.get('variable_values')
-            )
+        order_id = Order.create(customer_id, po_number, lines)
         return jsonify({'order_id': order_id}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _positive_int(value):
+    """value as an int if it is a whole number >= 1 (numeric strings allowed), else None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not number.is_integer() or number < 1:
+        return None
+    return int(number)
+
+
 @order_bp.route('/api/list')
 def api_list():
     orders = Order.get_all()
@@ -83,42 +102,63 @@ def api_confirm(order_id):
 def api_generate(order_id):
     """Generate layout data for all lines without changing order status."""
     try:
-        result = Order.get_by_id(order_id)
-        if not result:
+        if not Order.exists(order_id):
             return jsonify({'error': 'Not found'}), 404
-        import json
-        generated = []
-        for line in result['lines']:
-            vv = json.loads(line['variable_values']) if line['variable_values'] else {}
-            data = Order.generate_layout_data(line['layout_id'], vv)
-            generated.append(data)
+        generated = Order.generate_lines(order_id)
         return jsonify({'lines': generated})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@order_bp.route('/api/<order_id>/generate/stream', methods=['POST'])
+def api_generate_stream(order_id):
+    """Generate layout data as NDJSON, one record per line as soon as it is ready."""
+    if not Order.exists(order_id):
+        return jsonify({'error': 'Not found'}), 404
+
+    def records():
+        try:
+            for index, (line_id, generated_json) in enumerate(Order.iter_generated_lines(order_id)):
+                # generated_json is already serialized; embed it without re-encoding
+                yield f'{{"index": {index}, "line_id": {line_id}, "data": {generated_json or "null"}}}\n'
+        except Exception as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+
+    return Response(stream_with_context(records()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
+@order_bp.route('/api/<order_id>/export', methods=['POST'])
+def api_export(order_id):
+    """Export every line of an order as one PDF or AI file, one page per label."""
+    data = request.get_json(silent=True) or {}
+    export_format = data.get('format', 'ai')
+    if export_format not in ('pdf', 'ai'):
+        return jsonify({'error': "format must be 'pdf' or 'ai'"}), 400
+    outlined = bool(data.get('outlined', False))
+    try:
+        from output_profile import resolve_profile
+        from label_template import export_order_labels
+        try:
+            profile = resolve_profile(data.get('outputProfile'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not Order.exists(order_id):
+            return jsonify({'error': 'Not found'}), 404
+        lines = Order.get_export_lines(order_id)
+        if not lines:
+            return jsonify({'error': 'No lines to export'}), 400
+        filepath = export_order_labels(lines, export_format, outlined, profile)
+        suffix = ('_outlined' if outlined else '_editable') if export_format == 'ai' else ''
+        return send_artifact(filepath, as_attachment=True, download_name=f'{order_id}{suffix}.{export_format}')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @order_bp.route('/api/layouts/<customer_id>')
 def api_layouts(customer_id):
-    rows = execute_query(
-        "SELECT id, name, type, data, created_at FROM layouts WHERE customer_id = ? ORDER BY created_at DESC",
-        (customer_id,), fetch_all=True
-    )
-    import json
-    results = []
-    for r in rows:
-        d = dict(r)
-        var_count = 0
-        if d.get('data'):
-            try:
-                layout_data = json.loads(d['data']) if isinstance(d['data'], str) else d['data']
-                for c in layout_data.get('components', []):
-                    if c.get('isVariable'):
-                        var_count += 1
-            except Exception:
-                pass
-        d['var_count'] = var_count
-        results.append(d)
-    return jsonify(results)
+    """Layouts for a customer with their variable manifests (no artwork)."""
+    return jsonify(Layout.get_manifests_by_customer(customer_id))
 
 
 @order_bp.route('/api/excel/template', methods=['POST'])
@@ -130,8 +170,8 @@ def api_excel_template():
         return jsonify({'error': 'No variables provided'}), 400
     try:
         filepath = generate_template(variables)
-        return send_file(filepath, as_attachment=True,
-                         download_name=f'{layout_name}_template.xlsx')
+        return send_artifact(filepath, as_attachment=True,
+                             download_name=f'{layout_name}_template.xlsx')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -146,8 +186,8 @@ def api_excel_dummy():
         return jsonify({'error': 'No variables provided'}), 400
     try:
         filepath = generate_dummy(variables, row_count=row_count)
-        return send_file(filepath, as_attachment=True,
-                         download_name=f'{layout_name}_dummy.xlsx')
+        return send_artifact(filepath, as_attachment=True,
+                             download_name=f'{layout_name}_dummy.xlsx')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -159,9 +199,8 @@ def api_excel_upload():
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
-    ext = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
-    if ext != 'xlsx':
-        return jsonify({'error': 'Only .xlsx files are allowed'}), 400
+    if upload_extension(file.filename) not in UPLOAD_EXTENSIONS:
+        return jsonify({'error': 'Only .xlsx, .csv and .tsv files are allowed'}), 400
 
     variables_json = request.form.get('variables', '[]')
     expected_variables = json.loads(variables_json)
@@ -171,3 +210,48 @@ def api_excel_upload():
         return jsonify({'success': True, 'rows': result['rows']})
     else:
         return jsonify({'success': False, 'error': result['error']}), 400
+
+
+@order_bp.route('/api/excel/import', methods=['POST'])
+def api_excel_import():
+    """Validate an xlsx/csv/tsv straight from the upload stream and create the order from it.
+
+    Returns a summary and the first errors instead of the rows. With
+    validate_only=1 nothing is written.
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    if upload_extension(file.filename) not in UPLOAD_EXTENSIONS:
+        return jsonify({'error': 'Only .xlsx, .csv and .tsv files are allowed'}), 400
+
+    expected_variables = json.loads(request.form.get('variables', '[]'))
+    validate_only = request.form.get('validate_only') == '1'
+    customer_id = request.form.get('customer_id')
+    po_number = request.form.get('po_number')
+    layout_id = request.form.get('layout_id', type=int)
+    if not validate_only and (not customer_id or not po_number or not layout_id):
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    summary = UploadSummary()
+    try:
+        rows = summary.valid_rows(open_upload(file.filename, file.stream, expected_variables))
+        # Identical rows become one line with the summed quantity
+        lines = Order.collapse_lines(
+            {'layout_id': layout_id, 'quantity': row['quantity'], 'variable_values': row['variableValues']}
+            for row in rows
+        )
+        result = summary.to_dict()
+        if summary.error_count:
+            return jsonify({'success': False, 'error': summary.errors[0]['error'], **result}), 400
+        result['lines'] = len(lines)
+        if validate_only:
+            return jsonify({'success': True, 'order_id': None, **result}), 200
+        order_id = Order.create_batched(customer_id, po_number, lines)
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, 'order_id': order_id, **result}), 201
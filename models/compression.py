@@ -0,0 +1,25 @@
+"""Compressed storage format for large JSON payloads (layout data, generated order data)"""
+import zlib
+
+# Compressed payloads are stored as BLOBs starting with this header.
+# Anything without it is a legacy plain-JSON row and is returned as-is.
+HEADER = b'ZJ1\x00'
+COMPRESSION_LEVEL = 6
+
+
+def compress_json(text):
+    """Compress JSON text for storage"""
+    if text is None:
+        return None
+    return HEADER + zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def decompress_json(value):
+    """Return JSON text from a stored payload, compressed or legacy plain text"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value.startswith(HEADER):
+        return zlib.decompress(value[len(HEADER):]).decode('utf-8')
+    return value.decode('utf-8')
+
@@ -1,102 +1,139 @@
 """Database setup and connection management"""
 import sqlite3
 import os
+import threading
+import weakref
 from contextlib import contextmanager
 
 DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database.db')
 
+# Applied to every new connection. WAL lets readers run while a writer commits;
+# synchronous=NORMAL is durable in WAL mode and avoids an fsync per commit.
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-65536',      # 64 MB page cache
+    'PRAGMA mmap_size=268435456',    # 256 MB memory-mapped I/O
+    'PRAGMA temp_store=MEMORY',
+)
+
+# Prepared statements kept per connection (sqlite3 reuses them by SQL text)
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_connections = weakref.WeakSet()
+_connections_lock = threading.Lock()
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3 connection that can be tracked in a WeakSet"""
+
+
+def _connect():
+    """Open a new tuned connection and register it for teardown"""
+    conn = sqlite3.connect(
+        DATABASE_PATH,
+        timeout=10,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=_Connection,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    with _connections_lock:
+        _connections.add(conn)
+    return conn
+
+
+def get_connection():
+    """Return this thread's persistent connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    # A forked child must not reuse the parent's connection
+    if conn is None or _local.pid != os.getpid() or _local.path != DATABASE_PATH:
+        conn = _connect()
+        _local.conn = conn
+        _local.depth = 0
+        _local.tx_depth = 0
+        _local.pid = os.getpid()
+        _local.path = DATABASE_PATH
+    return conn
+
+
+def close_db():
+    """Close the calling thread's connection"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+def close_all_connections():
+    """Close every connection still open in this process (app shutdown)"""
+    with _connections_lock:
+        conns = list(_connections)
+        _connections.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.conn = None
+
+
 def init_db():
-    """Initialize database and create tables if they don't exist"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    # Create customers table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id TEXT UNIQUE NOT NULL,
-            company_name TEXT NOT NULL,
-            email_domain TEXT NOT NULL,
-            company_type TEXT,
-            address TEXT,
-            notes TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    # Create members table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS members (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            member_id TEXT UNIQUE NOT NULL,
-            customer_id TEXT NOT NULL,
-            name TEXT,
-            title TEXT,
-            email TEXT,
-            phone TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers(customer_id) ON DELETE CASCADE
-        )
-    ''')
-
-    # Create layouts table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS layouts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id TEXT,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,
-            data TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
-        )
-    ''')
-
-    # Create orders table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id TEXT UNIQUE NOT NULL,
-            customer_id TEXT NOT NULL,
-            po_number TEXT NOT NULL,
-            status TEXT NOT NULL DEFAULT 'draft',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
-        )
-    ''')
-
-    # Create order_lines table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS order_lines (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_id TEXT NOT NULL,
-            layout_id INTEGER NOT NULL,
-            quantity INTEGER NOT NULL DEFAULT 1,
-            variable_values TEXT,
-            generated_data TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (order_id) REFERENCES orders(order_id),
-            FOREIGN KEY (layout_id) REFERENCES layouts(id)
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+    """Initialize database and apply pending schema migrations"""
+    from models.migrations import run_migrations
+
+    with get_db() as conn:
+        applied = run_migrations(conn)
+    if applied:
+        print(f"Applied migrations {applied}")
     print(f"Database initialized at {DATABASE_PATH}")
 
 @contextmanager
 def get_db():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(DATABASE_PATH, timeout=10)
-    conn.row_factory = sqlite3.Row
+    """Context manager for the calling thread's database connection.
+
+    The connection is reused across calls; anything left uncommitted when the
+    outermost block exits is rolled back, as closing a fresh connection used to do.
+    """
+    conn = get_connection()
+    _local.depth = getattr(_local, 'depth', 0) + 1
     try:
         yield conn
     finally:
-        conn.close()
+        _local.depth -= 1
+        if _local.depth == 0 and conn.in_transaction:
+            conn.rollback()
+
+@contextmanager
+def transaction():
+    """Unit of work: statements inside commit once at the end, or roll back together.
+
+    Nested transaction() blocks and execute_query() writes join the outermost
+    block instead of committing on their own.
+    """
+    with get_db() as conn:
+        outermost = _local.tx_depth == 0
+        if outermost:
+            # Take the write lock up front so the unit of work can't deadlock halfway
+            conn.execute('BEGIN IMMEDIATE')
+        _local.tx_depth += 1
+        try:
+            yield conn
+        except BaseException:
+            _local.tx_depth -= 1
+            if outermost:
+                conn.rollback()
+            raise
+        _local.tx_depth -= 1
+        if outermost:
+            conn.commit()
+
+def in_transaction():
+    """True while the calling thread is inside a transaction() block"""
+    return getattr(_local, 'tx_depth', 0) > 0
 
 def execute_query(query, params=None, fetch_one=False, fetch_all=False):
     """Execute a query and return results"""
@@ -112,5 +149,6 @@ def execute_query(query, params=None, fetch_one=False, fetch_all=False):
         elif fetch_all:
             return cursor.fetchall()
         else:
-            conn.commit()
+            if not in_transaction():
+                conn.commit()
             return cursor.lastrowid
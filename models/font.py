@@ -1,64 +1,6 @@
 """Font model for managing uploaded fonts"""
 from models.database import execute_query, get_db
-import sqlite3
-
-def init_fonts_table():
-    """Create fonts table if it doesn't exist, and migrate if needed"""
-    from models.database import get_db
-
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        # Check if table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='fonts'")
-        table_exists = cursor.fetchone()
-
-        if table_exists:
-            # Check if we need to migrate (old table has UNIQUE on filename alone)
-            cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='fonts'")
-            create_sql = cursor.fetchone()[0]
-
-            needs_migrate = 'filename TEXT UNIQUE' in create_sql
-
-            if needs_migrate:
-                # Recreate table without the UNIQUE constraint
-                cursor.execute('ALTER TABLE fonts RENAME TO fonts_old')
-                cursor.execute('''
-                    CREATE TABLE fonts (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        font_name TEXT NOT NULL,
-                        filename TEXT NOT NULL,
-                        file_path TEXT NOT NULL,
-                        customer_id TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                cursor.execute('''
-                    INSERT INTO fonts (id, font_name, filename, file_path, customer_id, created_at)
-                    SELECT id, font_name, filename, file_path, customer_id, created_at
-                    FROM fonts_old
-                ''')
-                cursor.execute('DROP TABLE fonts_old')
-                conn.commit()
-            else:
-                # Just ensure customer_id column exists
-                cursor.execute("PRAGMA table_info(fonts)")
-                columns = [row[1] for row in cursor.fetchall()]
-                if 'customer_id' not in columns:
-                    cursor.execute("ALTER TABLE fonts ADD COLUMN customer_id TEXT")
-                    conn.commit()
-        else:
-            cursor.execute('''
-                CREATE TABLE fonts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    font_name TEXT NOT NULL,
-                    filename TEXT NOT NULL,
-                    file_path TEXT NOT NULL,
-                    customer_id TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
+import hashlib
 
 class Font:
     @staticmethod
@@ -157,3 +99,12 @@ class Font:
         """Delete a font"""
         query = 'DELETE FROM fonts WHERE id = ?'
         execute_query(query, (font_id,))
+
+    @staticmethod
+    def fingerprint():
+        """Hash of every font's id, name and file; changes on any create, rename or delete"""
+        rows = execute_query('SELECT id, font_name, file_path FROM fonts ORDER BY id', fetch_all=True)
+        h = hashlib.sha1()
+        for row in rows:
+            h.update(f"{row['id']}\0{row['font_name']}\0{row['file_path']}\n".encode('utf-8'))
+        return h.hexdigest()
@@ -1,54 +1,197 @@
 """Layout model for database operations"""
-from models.database import execute_query, get_db
+from models.database import execute_query, transaction
+from models.compression import compress_json, decompress_json
+from models.layout_cache import layout_cache
+import hashlib
 import json
 
+
+def _serialize(data):
+    """Serialize layout data to canonical JSON text"""
+    if isinstance(data, (dict, list)):
+        return json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return data
+
+
+def content_hash(data_json):
+    """Content hash used as the immutable version key"""
+    return hashlib.sha256(data_json.encode('utf-8')).hexdigest()
+
+
+def build_variable_manifest(data):
+    """Variable fields of a layout (component index, default content, type, font)"""
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return []
+    if not isinstance(data, dict):
+        return []
+    manifest = []
+    for idx, comp in enumerate(data.get('components', [])):
+        if comp.get('isVariable'):
+            manifest.append({
+                'idx': idx,
+                'content': comp.get('content') or '',
+                'type': comp.get('type', 'text'),
+                'fontFamily': comp.get('fontFamily') or '',
+                'fontSize': comp.get('fontSize') or 12,
+            })
+    return manifest
+
+
+# Metadata columns; the payload lives in layout_blobs and is joined in only when needed
+LAYOUT_COLUMNS = ('l.id, l.customer_id, l.name, l.type, l.version_hash, l.blob_id, '
+                  'l.variable_manifest, l.created_at, l.updated_at')
+
+
 class Layout:
+    @staticmethod
+    def _save_version(conn, layout_id, data_json):
+        """Store an immutable version (deduplicated by hash) and return (hash, blob_id)"""
+        version_hash = content_hash(data_json)
+        row = conn.execute('SELECT blob_id FROM layout_versions WHERE hash = ?', (version_hash,)).fetchone()
+        if row:
+            return version_hash, row[0]
+        blob_id = conn.execute(
+            'INSERT INTO layout_blobs (data) VALUES (?)', (compress_json(data_json),)
+        ).lastrowid
+        conn.execute(
+            'INSERT INTO layout_versions (hash, layout_id, blob_id) VALUES (?, ?, ?)',
+            (version_hash, layout_id, blob_id)
+        )
+        return version_hash, blob_id
+
     @staticmethod
     def create(name, layout_type, data, customer_id=None):
         """Create a new layout"""
-        data_json = json.dumps(data) if isinstance(data, (dict, list)) else data
-        query = '''
-            INSERT INTO layouts (customer_id, name, type, data)
-            VALUES (?, ?, ?, ?)
-        '''
-        layout_id = execute_query(query, (customer_id, name, layout_type, data_json))
+        data_json = _serialize(data)
+        with transaction() as conn:
+            cursor = conn.execute(
+                'INSERT INTO layouts (customer_id, name, type) VALUES (?, ?, ?)',
+                (customer_id, name, layout_type)
+            )
+            layout_id = cursor.lastrowid
+            if data_json:
+                version_hash, blob_id = Layout._save_version(conn, layout_id, data_json)
+                conn.execute(
+                    'UPDATE layouts SET version_hash = ?, blob_id = ?, variable_manifest = ? WHERE id = ?',
+                    (version_hash, blob_id, json.dumps(build_variable_manifest(data_json)), layout_id)
+                )
         return layout_id
 
     @staticmethod
     def get_by_id(layout_id):
         """Get layout by ID"""
-        query = 'SELECT * FROM layouts WHERE id = ?'
+        query = f'SELECT {LAYOUT_COLUMNS} FROM layouts l WHERE l.id = ?'
         row = execute_query(query, (layout_id,), fetch_one=True)
         if row:
             layout = dict(row)
-            # Parse JSON data
-            if layout['data']:
+            layout['data'] = None
+            if layout['version_hash']:
                 try:
-                    layout['data'] = json.loads(layout['data'])
-                except:
-                    pass
+                    layout['data'] = Layout.load_version(layout['version_hash'])
+                except ValueError:
+                    # Not valid JSON: hand back the raw text as before
+                    layout['data'] = Layout.get_version(layout['version_hash'])
             return layout
         return None
 
     @staticmethod
-    def get_all():
-        """Get all layouts"""
-        query = 'SELECT * FROM layouts ORDER BY created_at DESC'
-        rows = execute_query(query, fetch_all=True)
+    def load_version(version_hash):
+        """Parsed data of an immutable layout version, served from the layout cache.
+
+        Versions never change, so the hash alone validates the entry. The
+        caller gets its own copy and may modify it.
+        """
+        data = layout_cache.get(version_hash)
+        if data is None:
+            data_json = Layout.get_version(version_hash)
+            if data_json is None:
+                return None
+            data = json.loads(data_json)
+            layout_cache.put(version_hash, data)
+        return data
+
+    @staticmethod
+    def load_current(layout_id):
+        """Get (parsed data, version hash) of a layout's current version"""
+        row = execute_query('SELECT version_hash FROM layouts WHERE id = ?', (layout_id,), fetch_one=True)
+        if not row or not row['version_hash']:
+            return None, None
+        return Layout.load_version(row['version_hash']), row['version_hash']
+
+    @staticmethod
+    def get_version(version_hash):
+        """Get the raw JSON of an immutable layout version"""
+        row = execute_query(
+            '''SELECT b.data
+               FROM layout_versions v
+               JOIN layout_blobs b ON b.id = v.blob_id
+               WHERE v.hash = ?''',
+            (version_hash,), fetch_one=True
+        )
+        return decompress_json(row['data']) if row else None
+
+    @staticmethod
+    def list_summaries(customer_id=None, layout_type=None, limit=None, cursor=None):
+        """List layout metadata with customer name, newest first (no data column).
+
+        Keyset pagination: pass the returned next_cursor as cursor to get the
+        following page. Returns (layouts, next_cursor); next_cursor is None on
+        the last page.
+        """
+        conditions = []
+        params = []
+        if customer_id:
+            conditions.append('l.customer_id = ?')
+            params.append(customer_id)
+        if layout_type:
+            conditions.append('l.type = ?')
+            params.append(layout_type)
+        if cursor is not None:
+            conditions.append('l.id < ?')
+            params.append(int(cursor))
+        query = '''
+            SELECT l.id, l.name, l.type, l.customer_id, l.version_hash,
+                   l.created_at, l.updated_at, c.company_name AS customer_name
+            FROM layouts l
+            LEFT JOIN customers c ON c.customer_id = l.customer_id
+        '''
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY l.id DESC'
+        if limit:
+            # Fetch one extra row to know whether another page exists
+            query += ' LIMIT ?'
+            params.append(int(limit) + 1)
+        rows = execute_query(query, tuple(params), fetch_all=True)
+        layouts = [dict(row) for row in rows]
+        next_cursor = None
+        if limit and len(layouts) > int(limit):
+            layouts = layouts[:int(limit)]
+            next_cursor = layouts[-1]['id']
+        return layouts, next_cursor
+
+    @staticmethod
+    def get_manifests_by_customer(customer_id):
+        """Layout metadata plus variable manifest for a customer, without artwork"""
+        rows = execute_query(
+            '''SELECT id, name, type, version_hash, created_at, variable_manifest
+               FROM layouts
+               WHERE customer_id = ?
+               ORDER BY created_at DESC''',
+            (customer_id,), fetch_all=True
+        )
         layouts = []
         for row in rows:
             layout = dict(row)
-            # Don't parse data for list view (performance)
+            manifest = json.loads(layout.pop('variable_manifest') or '[]')
+            layout['variables'] = manifest
+            layout['var_count'] = len(manifest)
             layouts.append(layout)
         return layouts
 
-    @staticmethod
-    def get_by_customer(customer_id):
-        """Get layouts by customer ID"""
-        query = 'SELECT * FROM layouts WHERE customer_id = ? ORDER BY created_at DESC'
-        rows = execute_query(query, (customer_id,), fetch_all=True)
-        return [dict(row) for row in rows]
-
     @staticmethod
     def find_by_customer_and_name(customer_id, name):
         """Find layout by customer ID and name"""
@@ -58,20 +201,26 @@ class Layout:
 
     @staticmethod
     def update(layout_id, name=None, data=None, customer_id=None):
-        """Update layout"""
-        data_json = json.dumps(data) if data and isinstance(data, (dict, list)) else data
-        query = '''
-            UPDATE layouts
-            SET name = COALESCE(?, name),
-                data = COALESCE(?, data),
-                customer_id = COALESCE(?, customer_id),
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        '''
-        execute_query(query, (name, data_json, customer_id, layout_id))
+        """Update layout (a data change saves a new immutable version)"""
+        data_json = _serialize(data) if data else data
+        with transaction() as conn:
+            version_hash, blob_id, manifest_json = None, None, None
+            if data_json:
+                version_hash, blob_id = Layout._save_version(conn, layout_id, data_json)
+                manifest_json = json.dumps(build_variable_manifest(data_json))
+            conn.execute('''
+                UPDATE layouts
+                SET name = COALESCE(?, name),
+                    version_hash = COALESCE(?, version_hash),
+                    blob_id = COALESCE(?, blob_id),
+                    variable_manifest = COALESCE(?, variable_manifest),
+                    customer_id = COALESCE(?, customer_id),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (name, version_hash, blob_id, manifest_json, customer_id, layout_id))
 
     @staticmethod
     def delete(layout_id):
-        """Delete layout"""
+        """Delete layout (its versions stay for orders that reference them)"""
         query = 'DELETE FROM layouts WHERE id = ?'
         execute_query(query, (layout_id,))
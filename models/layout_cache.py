@@ -0,0 +1,72 @@
+"""In-process LRU cache of parsed layout data, keyed by immutable version hash"""
+import marshal
+import threading
+from collections import OrderedDict
+
+# Upper bound on the total size of cached (marshalled) layouts
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class LayoutCache:
+    """Size-bounded LRU of parsed layouts.
+
+    Entries are stored marshalled, so every get() hands out a fresh object:
+    callers may mutate what they receive without corrupting the cache.
+    Rebuilding from marshal is far cheaper than json.loads of the same layout.
+    """
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return a private copy of the cached data, or None"""
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return marshal.loads(blob)
+
+    def put(self, key, data):
+        """Cache parsed data (dicts, lists and scalars as produced by json.loads)"""
+        blob = marshal.dumps(data)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+layout_cache = LayoutCache()
@@ -0,0 +1,395 @@
+"""Versioned schema migrations.
+
+Each migration runs once, in order, inside its own transaction, and is
+recorded in the schema_version table. Migrations are written to be safe
+against databases created before the runner existed (IF NOT EXISTS,
+column checks), so the first run on an old database just catches up.
+"""
+import hashlib
+import json
+
+from models.compression import compress_json, decompress_json
+
+
+def _baseline(cursor):
+    """Tables that existed before versioned migrations"""
+    # Create customers table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id TEXT UNIQUE NOT NULL,
+            company_name TEXT NOT NULL,
+            email_domain TEXT NOT NULL,
+            company_type TEXT,
+            address TEXT,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Create members table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS members (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_id TEXT UNIQUE NOT NULL,
+            customer_id TEXT NOT NULL,
+            name TEXT,
+            title TEXT,
+            email TEXT,
+            phone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(customer_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Create layouts table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS layouts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id TEXT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+        )
+    ''')
+
+    # Create orders table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT UNIQUE NOT NULL,
+            customer_id TEXT NOT NULL,
+            po_number TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'draft',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+        )
+    ''')
+
+    # Create order_lines table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_lines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT NOT NULL,
+            layout_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 1,
+            variable_values TEXT,
+            generated_data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (order_id) REFERENCES orders(order_id),
+            FOREIGN KEY (layout_id) REFERENCES layouts(id)
+        )
+    ''')
+
+    _fonts_table(cursor)
+
+
+def _fonts_table(cursor):
+    """Create fonts table, or rebuild it if filename still carries UNIQUE"""
+    # Check if table exists
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='fonts'")
+    table_exists = cursor.fetchone()
+
+    if table_exists:
+        # Check if we need to migrate (old table has UNIQUE on filename alone)
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='fonts'")
+        create_sql = cursor.fetchone()[0]
+
+        needs_migrate = 'filename TEXT UNIQUE' in create_sql
+
+        if needs_migrate:
+            # Recreate table without the UNIQUE constraint
+            _ensure_column(cursor, 'fonts', 'customer_id', 'TEXT')
+            cursor.execute('ALTER TABLE fonts RENAME TO fonts_old')
+            cursor.execute('''
+                CREATE TABLE fonts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    font_name TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    customer_id TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                INSERT INTO fonts (id, font_name, filename, file_path, customer_id, created_at)
+                SELECT id, font_name, filename, file_path, customer_id, created_at
+                FROM fonts_old
+            ''')
+            cursor.execute('DROP TABLE fonts_old')
+        else:
+            # Just ensure customer_id column exists
+            _ensure_column(cursor, 'fonts', 'customer_id', 'TEXT')
+    else:
+        cursor.execute('''
+            CREATE TABLE fonts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                font_name TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                customer_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+
+def _layout_versions(cursor):
+    """Immutable content-hashed layout versions"""
+    # Create layout_versions table (immutable, keyed by content hash)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS layout_versions (
+            hash TEXT PRIMARY KEY,
+            layout_id INTEGER,
+            data TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _ensure_column(cursor, 'layouts', 'version_hash', 'TEXT')
+    _ensure_column(cursor, 'order_lines', 'layout_version', 'TEXT')
+
+    # Give pre-existing layouts their first version
+    rows = cursor.execute(
+        'SELECT id, data FROM layouts WHERE version_hash IS NULL AND data IS NOT NULL'
+    ).fetchall()
+    for layout_id, data_json in rows:
+        version_hash = _content_hash(data_json)
+        cursor.execute(
+            'INSERT OR IGNORE INTO layout_versions (hash, layout_id, data) VALUES (?, ?, ?)',
+            (version_hash, layout_id, data_json)
+        )
+        cursor.execute('UPDATE layouts SET version_hash = ? WHERE id = ?', (version_hash, layout_id))
+
+
+def _order_line_input_hash(cursor):
+    """Dirty tracking for generated order line data"""
+    _ensure_column(cursor, 'order_lines', 'input_hash', 'TEXT')
+
+
+def _hot_path_indexes(cursor):
+    """Indexes for the lookup columns used on every request"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_layouts_customer_name ON layouts(customer_id, name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_layouts_customer_created ON layouts(customer_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_layout_versions_layout ON layout_versions(layout_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_lines_order ON order_lines(order_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_lines_layout ON order_lines(layout_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fonts_font_name ON fonts(font_name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fonts_filename_customer ON fonts(filename, customer_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_members_customer ON members(customer_id, created_at)')
+
+
+def _compress_payloads(cursor):
+    """Rewrite plain-JSON payload rows in the compressed storage format"""
+    payload_columns = (
+        ('layouts', 'id', 'data'),
+        ('layout_versions', 'hash', 'data'),
+        ('order_lines', 'id', 'generated_data'),
+    )
+    reader = cursor.connection.cursor()
+    for table, key, column in payload_columns:
+        reader.execute(f"SELECT {key}, {column} FROM {table} WHERE typeof({column}) = 'text'")
+        while True:
+            rows = reader.fetchmany(500)
+            if not rows:
+                break
+            cursor.executemany(
+                f"UPDATE {table} SET {column} = ? WHERE {key} = ?",
+                [(compress_json(value), row_key) for row_key, value in rows]
+            )
+
+
+def _layout_blobs(cursor):
+    """Move payloads out of layout rows into layout_blobs, referenced by id"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS layout_blobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data BLOB NOT NULL
+        )
+    ''')
+    _ensure_column(cursor, 'layouts', 'blob_id', 'INTEGER')
+
+    # Rebuild layout_versions to reference a blob instead of holding data
+    cursor.execute('''
+        CREATE TABLE layout_versions_new (
+            hash TEXT PRIMARY KEY,
+            layout_id INTEGER,
+            blob_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (blob_id) REFERENCES layout_blobs(id)
+        )
+    ''')
+    reader = cursor.connection.cursor()
+    reader.execute('SELECT hash, layout_id, data, created_at FROM layout_versions')
+    for version_hash, layout_id, data, created_at in reader:
+        if isinstance(data, str):
+            data = compress_json(data)
+        blob_id = cursor.execute('INSERT INTO layout_blobs (data) VALUES (?)', (data,)).lastrowid
+        cursor.execute(
+            'INSERT INTO layout_versions_new (hash, layout_id, blob_id, created_at) VALUES (?, ?, ?, ?)',
+            (version_hash, layout_id, blob_id, created_at)
+        )
+    cursor.execute('DROP TABLE layout_versions')
+    cursor.execute('ALTER TABLE layout_versions_new RENAME TO layout_versions')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_layout_versions_layout ON layout_versions(layout_id)')
+
+    # Every layout with data has a version by now; point it at that blob
+    cursor.execute('''
+        UPDATE layouts
+        SET blob_id = (SELECT blob_id FROM layout_versions WHERE hash = layouts.version_hash),
+            data = NULL
+        WHERE version_hash IS NOT NULL
+    ''')
+
+
+def _variable_manifest(cursor):
+    """Precomputed variable manifest per layout for the order UI"""
+    _ensure_column(cursor, 'layouts', 'variable_manifest', 'TEXT')
+    reader = cursor.connection.cursor()
+    reader.execute('''
+        SELECT l.id, b.data
+        FROM layouts l
+        JOIN layout_blobs b ON b.id = l.blob_id
+        WHERE l.variable_manifest IS NULL
+    ''')
+    for layout_id, data in reader:
+        manifest = _variable_manifest_of(decompress_json(data))
+        cursor.execute('UPDATE layouts SET variable_manifest = ? WHERE id = ?', (json.dumps(manifest), layout_id))
+
+
+def _sequences(cursor):
+    """Atomic counters, seeded from existing data"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    # order_id is ORD-NNNNN; continue from the highest number in use
+    cursor.execute('''
+        INSERT OR IGNORE INTO sequences (name, value)
+        SELECT 'order_id', COALESCE(MAX(CAST(SUBSTR(order_id, 5) AS INTEGER)), 0)
+        FROM orders
+        WHERE order_id LIKE 'ORD-%'
+    ''')
+
+
+def _pin_order_lines(cursor):
+    """Pin order lines created before layout versions and keep their generated data"""
+    # Migration 2 gave every layout its first version but left existing lines
+    # unpinned, so they followed later edits of the layout
+    cursor.execute('''
+        UPDATE order_lines
+        SET layout_version = (SELECT version_hash FROM layouts WHERE id = order_lines.layout_id)
+        WHERE layout_version IS NULL
+    ''')
+
+    # Lines generated at confirmation have no input hash and would count as
+    # dirty; hash their pinned inputs (as Order._input_hash did at this
+    # version) so the stored data is kept instead of regenerated
+    reader = cursor.connection.cursor()
+    reader.execute('''
+        SELECT id, layout_version, variable_values
+        FROM order_lines
+        WHERE input_hash IS NULL AND generated_data IS NOT NULL AND layout_version IS NOT NULL
+    ''')
+    for line_id, layout_version, variable_values in reader:
+        key = f"{layout_version}\n{variable_values or ''}"
+        input_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        cursor.execute('UPDATE order_lines SET input_hash = ? WHERE id = ?', (input_hash, line_id))
+
+
+# (version, description, function) -- append only, never renumber
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline),
+    (2, 'immutable layout versions', _layout_versions),
+    (3, 'order line input hash', _order_line_input_hash),
+    (4, 'hot path indexes', _hot_path_indexes),
+    (5, 'compressed payload storage', _compress_payloads),
+    (6, 'layout payloads in layout_blobs', _layout_blobs),
+    (7, 'layout variable manifest', _variable_manifest),
+    (8, 'order id sequence', _sequences),
+    (9, 'pin legacy order lines', _pin_order_lines),
+]
+
+
+def current_version(conn):
+    """Highest applied migration version (0 for a fresh database)"""
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn):
+    """Apply pending migrations and return the versions that were applied"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+        # Take the write lock first so concurrent starters don't both migrate
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version > current_version(conn):
+                migrate(conn.cursor())
+                conn.execute(
+                    'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                    (version, description)
+                )
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if applied:
+        conn.execute('PRAGMA optimize')
+    return applied
+
+
+# Frozen copies of application helpers as they were when their migrations
+# shipped: a migration must behave the same on every database it ever runs on
+
+def _content_hash(data_json):
+    """models.layout.content_hash as of migration 2"""
+    return hashlib.sha256(data_json.encode('utf-8')).hexdigest()
+
+
+def _variable_manifest_of(data):
+    """models.layout.build_variable_manifest as of migration 7"""
+    try:
+        data = json.loads(data)
+    except ValueError:
+        return []
+    if not isinstance(data, dict):
+        return []
+    manifest = []
+    for idx, comp in enumerate(data.get('components', [])):
+        if comp.get('isVariable'):
+            manifest.append({
+                'idx': idx,
+                'content': comp.get('content') or '',
+                'type': comp.get('type', 'text'),
+                'fontFamily': comp.get('fontFamily') or '',
+                'fontSize': comp.get('fontSize') or 12,
+            })
+    return manifest
+
+
+def _ensure_column(cursor, table, column, decl):
+    """Add a column to an existing table if it is missing"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    columns = [row[1] for row in cursor.fetchall()]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
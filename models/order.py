@@ -1,34 +1,92 @@
 """Order model for database operations"""
-from models.database import execute_query, get_db
+from models.database import execute_query, get_db, transaction
+from models.layout import Layout
+from models.compression import compress_json, decompress_json
+import hashlib
 import json
-import copy
 import sys
 import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from tools.flatten_tree import flatten_layout_for_export
 
+# Regenerated lines are written back in batches of this many while generating
+GENERATE_BATCH_SIZE = 200
+# Imported lines are inserted in transactions of this many rows
+IMPORT_BATCH_SIZE = 1000
+
 
 class Order:
     @staticmethod
-    def _next_order_id():
-        row = execute_query(
-            "SELECT order_id FROM orders ORDER BY id DESC LIMIT 1",
-            fetch_one=True
-        )
-        if row:
-            num = int(dict(row)['order_id'].split('-')[1]) + 1
-        else:
-            num = 1
+    def _next_order_id(conn):
+        """Reserve the next order number; the caller must hold the write lock"""
+        conn.execute("UPDATE sequences SET value = value + 1 WHERE name = 'order_id'")
+        num = conn.execute("SELECT value FROM sequences WHERE name = 'order_id'").fetchone()[0]
         return f"ORD-{num:05d}"
 
     @staticmethod
-    def create(customer_id, po_number):
-        order_id = Order._next_order_id()
-        execute_query(
-            "INSERT INTO orders (order_id, customer_id, po_number) VALUES (?, ?, ?)",
-            (order_id, customer_id, po_number)
-        )
+    def collapse_lines(lines):
+        """Merge lines with the same layout and variable values, summing their quantities.
+
+        lines: iterable of dicts with layout_id, quantity and variable_values,
+        consumed lazily; layout_id and quantity are converted with int().
+        Memory grows with distinct variants, not with rows.
+        The first occurrence of each variant keeps its position.
+        """
+        merged = {}
+        for line in lines:
+            # JSON clients may send numbers as strings: '2' + '3' must be 5, not '23'
+            layout_id = int(line['layout_id'])
+            quantity = int(line['quantity'])
+            vv = line.get('variable_values') or None
+            key = (layout_id, json.dumps(vv, sort_keys=True) if vv else None)
+            existing = merged.get(key)
+            if existing:
+                existing['quantity'] += quantity
+            else:
+                merged[key] = {'layout_id': layout_id, 'quantity': quantity, 'variable_values': vv}
+        return list(merged.values())
+
+    @staticmethod
+    def create(customer_id, po_number, lines=None):
+        """Create an order, optionally with its lines, in a single transaction.
+
+        lines: iterable of dicts with layout_id, quantity and variable_values.
+        Identical lines are collapsed into one with the summed quantity.
+        """
+        # transaction() takes the write lock up front (BEGIN IMMEDIATE), so
+        # concurrent creators serialize on the sequence instead of colliding
+        with transaction() as conn:
+            order_id = Order._next_order_id(conn)
+            conn.execute(
+                "INSERT INTO orders (order_id, customer_id, po_number) VALUES (?, ?, ?)",
+                (order_id, customer_id, po_number)
+            )
+            if lines:
+                Order.add_lines(order_id, Order.collapse_lines(lines))
+        return order_id
+
+    @staticmethod
+    def create_batched(customer_id, po_number, lines, batch_size=IMPORT_BATCH_SIZE):
+        """Create an order from a large list of lines, inserting them in batched transactions.
+
+        lines: list of dicts with layout_id, quantity and variable_values
+        (collapse them first). The order stays 'importing' until every line
+        is in and is removed if an insert fails. Returns order_id.
+        """
+        with transaction() as conn:
+            order_id = Order._next_order_id(conn)
+            conn.execute(
+                "INSERT INTO orders (order_id, customer_id, po_number, status) VALUES (?, ?, ?, 'importing')",
+                (order_id, customer_id, po_number)
+            )
+        try:
+            for start in range(0, len(lines), batch_size):
+                Order.add_lines(order_id, lines[start:start + batch_size])
+        except BaseException:
+            Order.delete(order_id)
+            raise
+        execute_query("UPDATE orders SET status = 'draft' WHERE order_id = ?", (order_id,))
         return order_id
 
     @staticmethod
@@ -54,34 +112,63 @@ class Order:
         if not order:
             return None
         lines = execute_query(
-            """SELECT ol.*, l.name as layout_name, l.type as layout_type
+            """SELECT ol.*, l.name as layout_name, l.type as layout_type,
+                      COALESCE(ol.layout_version, l.version_hash) AS effective_version
                FROM order_lines ol
                JOIN layouts l ON l.id = ol.layout_id
                WHERE ol.order_id = ?""",
             (order_id,), fetch_all=True
         )
-        return {"order": dict(order), "lines": [dict(l) for l in lines]}
+        lines = [dict(l) for l in lines]
+        for line in lines:
+            line['generated_data'] = decompress_json(line['generated_data'])
+        return {"order": dict(order), "lines": lines}
+
+    @staticmethod
+    def exists(order_id):
+        row = execute_query("SELECT 1 FROM orders WHERE order_id = ?", (order_id,), fetch_one=True)
+        return row is not None
 
     @staticmethod
     def add_line(order_id, layout_id, quantity, variable_values=None):
-        vv_json = json.dumps(variable_values) if variable_values else None
-        execute_query(
-            "INSERT INTO order_lines (order_id, layout_id, quantity, variable_values) VALUES (?, ?, ?, ?)",
-            (order_id, layout_id, quantity, vv_json)
+        Order.add_lines(order_id, [{
+            'layout_id': layout_id,
+            'quantity': quantity,
+            'variable_values': variable_values,
+        }])
+
+    @staticmethod
+    def add_lines(order_id, lines):
+        """Bulk-insert order lines with one executemany inside one transaction"""
+        rows = (
+            (order_id, line['layout_id'], line['quantity'],
+             json.dumps(line['variable_values']) if line.get('variable_values') else None,
+             line['layout_id'])
+            for line in lines
         )
+        with transaction() as conn:
+            # Pin each line to the layout's current version so later edits don't change it
+            conn.executemany(
+                """INSERT INTO order_lines (order_id, layout_id, quantity, variable_values, layout_version)
+                   VALUES (?, ?, ?, ?, (SELECT version_hash FROM layouts WHERE id = ?))""",
+                rows
+            )
 
     @staticmethod
     def delete(order_id):
-        execute_query("DELETE FROM order_lines WHERE order_id = ?", (order_id,))
-        execute_query("DELETE FROM orders WHERE order_id = ?", (order_id,))
+        with transaction():
+            execute_query("DELETE FROM order_lines WHERE order_id = ?", (order_id,))
+            execute_query("DELETE FROM orders WHERE order_id = ?", (order_id,))
 
     @staticmethod
-    def generate_layout_data(layout_id, variable_values):
-        row = execute_query("SELECT data FROM layouts WHERE id = ?", (layout_id,), fetch_one=True)
-        if not row:
-            return None
-        layout_data = json.loads(dict(row)['data'])
-        data = copy.deepcopy(layout_data)
+    def generate_layout_data(layout_id, variable_values, layout_version=None):
+        # load_version hands out a private copy, safe to fill in below
+        data = Layout.load_version(layout_version) if layout_version else None
+        if data is None:
+            # Unpinned (legacy) line: use the layout's current version
+            data, layout_version = Layout.load_current(layout_id)
+            if data is None:
+                return None
         if variable_values:
             # Apply variable values to components (overlay-only, for variable indexing)
             for idx, comp in enumerate(data.get('components', [])):
@@ -95,35 +182,117 @@ class Order:
                     idx_key = str(idx)
                     if idx_key in variable_values:
                         ov['content'] = variable_values[idx_key]
+                        # Barcode and QR overlays encode their value
+                        if ov.get('type') == 'qrcoderegion':
+                            ov['qrData'] = variable_values[idx_key]
+                        elif ov.get('type') == 'barcoderegion':
+                            ov['barcodeData'] = variable_values[idx_key]
         # Build full export-ready payload (flattened tree + overlays with variables applied)
         data['exportPayload'] = flatten_layout_for_export(data)
+        data['layoutVersion'] = layout_version
         return data
 
     @staticmethod
-    def generate_and_store(order_id):
-        # Read lines and generate data first (separate connections for reads)
+    def get_export_lines(order_id):
+        """Lines to export in line order: layout version, variable values and quantity.
+
+        Unpinned (legacy) lines use their layout's current version.
+        """
+        rows = execute_query(
+            """SELECT ol.id, ol.quantity, ol.variable_values,
+                      COALESCE(ol.layout_version, l.version_hash) AS layout_version
+               FROM order_lines ol
+               LEFT JOIN layouts l ON l.id = ol.layout_id
+               WHERE ol.order_id = ?
+               ORDER BY ol.id""",
+            (order_id,), fetch_all=True
+        )
+        lines = [dict(row) for row in rows]
+        for line in lines:
+            line['variable_values'] = json.loads(line['variable_values']) if line['variable_values'] else {}
+        return lines
+
+    @staticmethod
+    def _input_hash(layout_version, variable_values_json):
+        """Hash of everything a line's generated data depends on"""
+        key = f"{layout_version or ''}\n{variable_values_json or ''}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def iter_generated_lines(order_id, batch_size=GENERATE_BATCH_SIZE):
+        """Yield (line_id, generated JSON text) per line, in line order, as each is ready.
+
+        Lines whose inputs are unchanged are served from storage; regenerated
+        lines are written back every batch_size lines. The text is None when
+        the line's layout no longer exists.
+        """
         with get_db() as conn:
             lines = conn.execute(
-                "SELECT id, layout_id, variable_values FROM order_lines WHERE order_id = ?",
+                """SELECT ol.id, ol.layout_id, ol.variable_values, ol.layout_version,
+                          ol.input_hash, ol.generated_data,
+                          COALESCE(ol.layout_version, l.version_hash) AS effective_version
+                   FROM order_lines ol
+                   LEFT JOIN layouts l ON l.id = ol.layout_id
+                   WHERE ol.order_id = ?
+                   ORDER BY ol.id""",
                 (order_id,)
             ).fetchall()
             lines = [dict(l) for l in lines]
 
-        generated_pairs = []
-        for line in lines:
-            vv = json.loads(line['variable_values']) if line['variable_values'] else {}
-            generated = Order.generate_layout_data(line['layout_id'], vv)
-            generated_pairs.append((json.dumps(generated), line['id']))
+        dirty = []
+        # Lines with the same inputs (layout version + variable values) are generated once
+        by_input = {}
+        try:
+            for line in lines:
+                input_hash = Order._input_hash(line['effective_version'], line['variable_values'])
+                if line['generated_data'] and line['input_hash'] == input_hash:
+                    # Clean line: serve the stored result
+                    generated_json = decompress_json(line['generated_data'])
+                    by_input[input_hash] = generated_json
+                    yield line['id'], generated_json
+                    continue
+                generated_json = by_input.get(input_hash)
+                if generated_json is None:
+                    vv = json.loads(line['variable_values']) if line['variable_values'] else {}
+                    generated = Order.generate_layout_data(line['layout_id'], vv, line['layout_version'])
+                    generated_json = json.dumps(generated) if generated is not None else None
+                    if generated_json is not None:
+                        by_input[input_hash] = generated_json
+                if generated_json is not None:
+                    dirty.append((compress_json(generated_json), input_hash, line['id']))
+                    if len(dirty) >= batch_size:
+                        Order._store_generated(dirty)
+                        dirty = []
+                yield line['id'], generated_json
+        finally:
+            # Also runs when a streaming client disconnects, so finished work is kept
+            Order._store_generated(dirty)
 
-        # Write all updates in one connection
-        with get_db() as conn:
-            for gen_json, line_id in generated_pairs:
-                conn.execute(
-                    "UPDATE order_lines SET generated_data = ? WHERE id = ?",
-                    (gen_json, line_id)
-                )
-            conn.execute(
-                "UPDATE orders SET status = 'confirmed', updated_at = CURRENT_TIMESTAMP WHERE order_id = ?",
-                (order_id,)
+    @staticmethod
+    def _store_generated(dirty):
+        """Write regenerated lines (generated_data, input_hash, id) in one transaction"""
+        if not dirty:
+            return
+        with transaction() as conn:
+            conn.executemany(
+                "UPDATE order_lines SET generated_data = ?, input_hash = ? WHERE id = ?",
+                dirty
             )
-            conn.commit()
+
+    @staticmethod
+    def generate_lines(order_id):
+        """Generate data for every line, recomputing only lines whose inputs changed"""
+        return [
+            json.loads(generated_json) if generated_json is not None else None
+            for _, generated_json in Order.iter_generated_lines(order_id)
+        ]
+
+    @staticmethod
+    def generate_and_store(order_id):
+        # Generate outside any transaction: lines are written back in short
+        # batches, so the write lock isn't held through the CPU-bound work
+        Order.generate_lines(order_id)
+        execute_query(
+            "UPDATE orders SET status = 'confirmed', updated_at = CURRENT_TIMESTAMP WHERE order_id = ?",
+            (order_id,)
+        )
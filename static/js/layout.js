@@ -22,7 +22,7 @@ function displayLayouts(layouts) {
     if (!tbody) return;
 
     if (layouts.length === 0) {
-        tbody.innerHTML = '<tr><td colspan="7" style="text-align: center; padding: 40px;">No layouts found</td></tr>';
+        tbody.innerHTML = '<tr><td colspan="8" style="text-align: center; padding: 40px;">No layouts found</td></tr>';
         return;
     }
 
@@ -43,10 +43,15 @@ function displayLayouts(layouts) {
         const createdDate = formatDateTime(layout.created_at);
         const updatedDate = formatDateTime(layout.updated_at);
         const customerName = layout.customer_name || '-';
+        // Server-rendered SVG per version, cached by the browser
+        const preview = layout.version_hash
+            ? `<img class="layout-thumb" src="/layout/thumbnail/${layout.version_hash}.svg" loading="lazy" alt="">`
+            : '-';
 
         return `
             <tr>
                 <td>${layout.id}</td>
+                <td>${preview}</td>
                 <td>${layout.name}</td>
                 <td>${layout.type.toUpperCase()}</td>
                 <td>${customerName}</td>
@@ -0,0 +1,61 @@
+"""Order line collapsing and validation of /order/api/create.
+
+Run with: python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from flask import Flask
+
+from blueprints.order import order_bp
+from models.order import Order
+
+
+class CollapseLinesTest(unittest.TestCase):
+    def test_string_quantities_are_summed(self):
+        lines = Order.collapse_lines([
+            {'layout_id': 1, 'quantity': '2', 'variable_values': {'0': 'A'}},
+            {'layout_id': '1', 'quantity': '3', 'variable_values': {'0': 'A'}},
+            {'layout_id': 1, 'quantity': 4, 'variable_values': {'0': 'B'}},
+        ])
+        self.assertEqual(lines, [
+            {'layout_id': 1, 'quantity': 5, 'variable_values': {'0': 'A'}},
+            {'layout_id': 1, 'quantity': 4, 'variable_values': {'0': 'B'}},
+        ])
+
+    def test_mixed_quantity_types(self):
+        lines = Order.collapse_lines([
+            {'layout_id': 2, 'quantity': 2, 'variable_values': None},
+            {'layout_id': 2, 'quantity': '3', 'variable_values': {}},
+        ])
+        self.assertEqual(lines, [{'layout_id': 2, 'quantity': 5, 'variable_values': None}])
+
+
+class CreateValidationTest(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(order_bp)
+        self.client = app.test_client()
+
+    def _create(self, lines):
+        return self.client.post('/order/api/create', json={
+            'customer_id': 'CUST-1', 'po_number': 'PO-1', 'lines': lines,
+        })
+
+    def test_rejects_bad_quantities(self):
+        for quantity in (None, 0, -1, '1.5', 'abc', True):
+            response = self._create([{'layout_id': 1, 'quantity': quantity}])
+            self.assertEqual(response.status_code, 400, quantity)
+        response = self._create([{'layout_id': 1}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_bad_layout_id(self):
+        for layout_id in (None, 'x', 0):
+            response = self._create([{'layout_id': layout_id, 'quantity': 1}])
+            self.assertEqual(response.status_code, 400, layout_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
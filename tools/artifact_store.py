@@ -0,0 +1,193 @@
+"""Managed directories for generated files: exports, Excel downloads and cached renders.
+
+A file is written under a staging name (stage()) and renamed into place by
+commit() once complete, so a partial file is never served, cached or
+counted. Each store caps its directory's total size, evicting the least
+recently used files first, and removes files older than its TTL. sweep()
+does both; start_sweeper() runs it periodically in a background thread.
+
+One-shot downloads go through send_artifact(), which deletes the file once
+the response has been sent. Caches commit under a key and find the file
+again with lookup().
+"""
+import os
+import re
+import threading
+import time
+import uuid
+
+TMP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.tmp')
+
+# Downloads are normally deleted right after sending; these bound what is left
+TMP_MAX_BYTES = 1024 * 1024 * 1024
+TMP_TTL = 3600
+
+# Seconds between background sweeps
+SWEEP_INTERVAL = 300
+
+# Files this recent are kept even over the size cap: they are about to be sent
+EVICT_MIN_AGE = 60
+
+# Staging files of writes in progress (never evicted for size)
+STAGING_PREFIX = '~'
+# Staging files older than this were left by a crash (stores without a TTL)
+STALE_STAGING_AGE = 24 * 3600
+
+_KEY_RE = re.compile(r'^[0-9A-Za-z_-]{1,128}$')
+
+
+class ArtifactStore:
+    """Size-capped directory of generated files with TTL and LRU eviction.
+
+    Recency is the file's mtime: the write, or the last lookup() of a keyed
+    file. Other files found in the directory are managed the same way.
+    """
+
+    def __init__(self, root, max_bytes, ttl=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Committed bytes since the last sweep (None until the first one)
+        self._bytes = None
+        self._sweeper = None
+        os.makedirs(root, exist_ok=True)
+
+    def stage(self, suffix=''):
+        """Create an empty staging file and return its path; write it, then commit() it.
+
+        Also usable as scratch space: a staging file the caller deletes itself
+        is never committed. One that is neither is removed by sweep().
+        """
+        path = os.path.join(self.root, f'{STAGING_PREFIX}{uuid.uuid4().hex}{suffix}')
+        open(path, 'xb').close()
+        return path
+
+    def commit(self, staging_path, key=None):
+        """Move a finished staging file into place and return its final path.
+
+        With a key (letters, digits, '-' and '_') the file is stored as
+        <key><suffix>, replacing any previous file for that key.
+        """
+        name = os.path.basename(staging_path)[len(STAGING_PREFIX):]
+        if key is None:
+            path = os.path.join(self.root, name)
+        else:
+            path = self._key_path(key, name[32:])
+        os.replace(staging_path, path)
+
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes += size
+            over = self._bytes is None or self._bytes > self.max_bytes
+        if over:
+            self.sweep()
+        return path
+
+    def lookup(self, key, suffix=''):
+        """Path of the file committed under key, or None; marks it recently used"""
+        path = self._key_path(key, suffix)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def discard(self, path):
+        """Delete a file of this store now (missing or still open files are left to sweep())"""
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.root):
+            return
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def sweep(self):
+        """Remove expired files, then least recently used ones while over the size cap.
+
+        Returns the number of files removed.
+        """
+        now = time.time()
+        staging_age = self.ttl if self.ttl is not None else STALE_STAGING_AGE
+        removed = 0
+        total = 0
+        entries = []
+        try:
+            scan = list(os.scandir(self.root))
+        except OSError:
+            return 0
+        for entry in scan:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            age = now - st.st_mtime
+            if entry.name.startswith(STAGING_PREFIX):
+                if age > staging_age and self._remove(entry.path):
+                    removed += 1
+            elif self.ttl is not None and age > self.ttl:
+                if self._remove(entry.path):
+                    removed += 1
+            else:
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        if total > self.max_bytes:
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes or now - mtime < EVICT_MIN_AGE:
+                    break
+                if self._remove(path):
+                    removed += 1
+                    total -= size
+        with self._lock:
+            self._bytes = total
+        return removed
+
+    def start_sweeper(self, interval=SWEEP_INTERVAL):
+        """Run sweep() every interval seconds in a daemon thread (once per store)"""
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_forever, args=(interval,),
+                                             name=f'sweep {os.path.basename(self.root)}', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_forever(self, interval):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: Artifact sweep of {self.root} failed: {e}")
+            time.sleep(interval)
+
+    def _key_path(self, key, suffix):
+        if not _KEY_RE.match(key):
+            raise ValueError(f"Invalid artifact key '{key}'")
+        return os.path.join(self.root, key + suffix)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            # Gone already, or still open (Windows): the next sweep retries
+            return False
+
+
+artifacts = ArtifactStore(TMP_DIR, TMP_MAX_BYTES, TMP_TTL)
+
+
+def send_artifact(filepath, **kwargs):
+    """send_file() for a one-shot artifact: the file is deleted once the response is closed"""
+    from flask import send_file
+    from werkzeug.wsgi import ClosingIterator
+    response = send_file(filepath, **kwargs)
+    # send_file responses are passed straight to the server, which skips
+    # call_on_close(): hook the body's close() instead (it closes the file first)
+    response.response = ClosingIterator(response.response, lambda: artifacts.discard(filepath))
+    return response
@@ -0,0 +1,69 @@
+"""Benchmark per-query overhead: connection per query vs the persistent connection manager.
+
+Usage: python tools/bench_db.py [queries]
+Runs against a throwaway database in .tmp/, never the real database.db.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models import database
+
+
+def _connection_per_query(path, n):
+    """The old get_db: open, query, close for every call"""
+    for i in range(n):
+        conn = sqlite3.connect(path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('SELECT * FROM customers WHERE customer_id = ?', (f'CUST-{i % 100:08d}',)).fetchone()
+        finally:
+            conn.close()
+
+
+def _persistent(n):
+    for i in range(n):
+        database.execute_query('SELECT * FROM customers WHERE customer_id = ?',
+                               (f'CUST-{i % 100:08d}',), fetch_one=True)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tmp_dir = os.path.join(os.path.dirname(__file__), '..', '.tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.db', dir=tmp_dir)
+    os.close(fd)
+    database.close_db()
+    database.DATABASE_PATH = path
+    try:
+        with database.get_db() as conn:
+            conn.execute('CREATE TABLE customers (id INTEGER PRIMARY KEY, customer_id TEXT UNIQUE, company_name TEXT)')
+            conn.executemany('INSERT INTO customers (customer_id, company_name) VALUES (?, ?)',
+                             [(f'CUST-{i:08d}', f'Company {i}') for i in range(100)])
+            conn.commit()
+
+        t0 = time.perf_counter()
+        _connection_per_query(path, n)
+        before = (time.perf_counter() - t0) / n * 1e6
+
+        t0 = time.perf_counter()
+        _persistent(n)
+        after = (time.perf_counter() - t0) / n * 1e6
+
+        print(f"{n} point queries")
+        print(f"  connection per query: {before:8.1f} us/query")
+        print(f"  persistent (WAL):     {after:8.1f} us/query  ({before / after:.1f}x)")
+    finally:
+        database.close_all_connections()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.unlink(path + suffix)
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    main()
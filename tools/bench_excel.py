@@ -0,0 +1,93 @@
+"""Benchmark Excel dummy generation: in-memory workbook (ws.cell) vs write-only streaming.
+
+Usage: python tools/bench_excel.py [rows ...]   (default: 100000 1000000)
+Each run happens in a fresh process so peak RSS is per run. The in-memory
+variant is skipped above 100k rows unless --all is given (it needs GBs of RAM).
+Output files go to .tmp/ and are deleted afterwards. Peak RSS needs the Unix
+resource module; on Windows the column shows n/a.
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage, peak RSS is not reported
+    resource = None
+
+sys.path.insert(0, os.path.dirname(__file__))
+import openpyxl
+import excel_order
+from artifact_store import TMP_DIR
+
+VARIABLES = [
+    {'idx': 0, 'content': 'name'},
+    {'idx': 1, 'content': 'address'},
+    {'idx': 2, 'content': 'city'},
+    {'idx': 3, 'content': 'zip'},
+]
+LEGACY_MAX_ROWS = 100000
+
+
+def _legacy_dummy(variables, row_count):
+    """The previous generate_dummy: normal workbook, one ws.cell call per cell"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    for col_idx, var in enumerate(variables, start=1):
+        ws.cell(row=1, column=col_idx, value=var['content'])
+    ws.cell(row=1, column=len(variables) + 1, value='qty')
+    makers = [excel_order._placeholder_maker(var['content']) for var in variables]
+    for row in range(2, row_count + 2):
+        for col_idx, make in enumerate(makers, start=1):
+            ws.cell(row=row, column=col_idx, value=make())
+        ws.cell(row=row, column=len(variables) + 1, value=random.randint(1, 50))
+    fd, filepath = tempfile.mkstemp(suffix='.xlsx', dir=TMP_DIR)
+    os.close(fd)
+    wb.save(filepath)
+    return filepath
+
+
+def _run(args):
+    variant, rows = args
+    t0 = time.perf_counter()
+    if variant == 'legacy':
+        path = _legacy_dummy(VARIABLES, rows)
+    else:
+        path = excel_order.generate_dummy(VARIABLES, row_count=rows)
+    elapsed = time.perf_counter() - t0
+    size = os.path.getsize(path)
+    os.unlink(path)
+    peak_mb = None
+    if resource is not None:
+        # ru_maxrss is in KB on Linux
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return elapsed, peak_mb, size
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    run_all = '--all' in sys.argv
+    sizes = [int(a) for a in args] or [100000, 1000000]
+    os.makedirs(TMP_DIR, exist_ok=True)
+
+    ctx = multiprocessing.get_context('spawn')
+    print(f"{'rows':>9}  {'variant':<11} {'seconds':>8} {'rows/s':>9} {'peak MB':>8} {'file MB':>8}")
+    for rows in sizes:
+        variants = ['write-only']
+        if rows <= LEGACY_MAX_ROWS or run_all:
+            variants.insert(0, 'legacy')
+        for variant in variants:
+            with ctx.Pool(1, maxtasksperchild=1) as pool:
+                elapsed, peak_mb, size = pool.apply(_run, ((variant, rows),))
+            peak = f"{peak_mb:8.1f}" if peak_mb is not None else f"{'n/a':>8}"
+            print(f"{rows:>9}  {variant:<11} {elapsed:8.2f} {rows / elapsed:9.0f} "
+                  f"{peak} {size / 1048576:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
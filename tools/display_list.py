@@ -0,0 +1,846 @@
+"""Display list shared by the AI and PDF exporters.
+
+compile_page() turns one page payload into backend-neutral drawing ops:
+fonts resolved and registered, coordinates already in PDF points, barcode
+and QR modules merged into one path, z-layers explicit. replay() emits a
+compiled list onto a ReportLab canvas. get_display_list() caches compiled
+lists per (flavor, outlined, payload) until the fonts table changes.
+
+Flavors keep each exporter's own semantics: 'ai' adds the separateInvisible
+z-layers, bounds rect borders, round joins and Illustrator font naming;
+'pdf' closes open subpaths and uses plain font registration.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models.layout_cache import LayoutCache
+
+FLAVORS = ('pdf', 'ai')
+
+# Upper bound on the total size of cached (marshalled) display lists
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+display_list_cache = LayoutCache(MAX_CACHE_BYTES)
+
+# Font resolutions and metrics shared by every export in this process,
+# dropped (with the display lists) whenever the fonts table changes
+_font_cache = {}
+_font_cache_fingerprint = None
+
+STANDARD_FONTS = {
+    'Arial': 'Helvetica',
+    'Times New Roman': 'Times-Roman',
+    'Courier New': 'Courier'
+}
+
+
+def refresh_fonts():
+    """Once per document: keep cached fonts and display lists only if the fonts table is unchanged"""
+    global _font_cache_fingerprint
+    try:
+        from models.font import Font
+        fingerprint = Font.fingerprint()
+    except Exception as e:
+        print(f"Warning: Could not check uploaded fonts: {e}")
+        fingerprint = None
+    if fingerprint != _font_cache_fingerprint:
+        _font_cache.clear()
+        display_list_cache.clear()
+        _font_cache_fingerprint = fingerprint
+
+
+def fonts_fingerprint():
+    """Fonts table fingerprint the cached fonts were resolved against (see refresh_fonts)"""
+    return _font_cache_fingerprint
+
+
+def get_display_list(data, flavor, outlined=False, content_key=None):
+    """Compiled display list of a page payload, from the cache when possible.
+
+    content_key is the payload's page_key(); pass it when already computed
+    to skip serialising again.
+    """
+    if content_key is None:
+        content_key = page_key(data)
+    key = hashlib.sha1(f'{flavor}\0{bool(outlined)}\0{content_key}'.encode('utf-8')).hexdigest()
+    display_list = display_list_cache.get(key)
+    if display_list is None:
+        display_list = compile_page(data, flavor, outlined)
+        display_list_cache.put(key, display_list)
+    return display_list
+
+
+def page_copies(data):
+    """Number of pages a payload should produce (its 'copies', at least 1)"""
+    try:
+        return max(1, int(data.get('copies') or 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def page_key(data):
+    """Identity of a page's drawing, ignoring how many copies are wanted"""
+    return json.dumps({k: v for k, v in data.items() if k != 'copies'}, sort_keys=True)
+
+
+def begin_page_form(c, name, page_w, page_h):
+    """beginForm() for a page's content on canvas c.
+
+    A form is clipped to its BBox: leave a page of room on every side for
+    content outside the artboard (e.g. the AI separator line).
+    """
+    c.beginForm(name, lowerx=-page_w, lowery=-page_h, upperx=2 * page_w, uppery=2 * page_h)
+
+
+def draw_pages(c, pages_data, draw_page):
+    """Emit every page of a batch onto canvas c (the caller saves it).
+
+    A payload's 'copies' emits that many pages. Content used on more than
+    one page (copies, or identical payloads) is drawn once into a Form
+    XObject and referenced from each page. draw_page(c, data, content_key)
+    draws one payload's content.
+    """
+    keys = [page_key(data) for data in pages_data]
+    uses = {}
+    for key, data in zip(keys, pages_data):
+        uses[key] = uses.get(key, 0) + page_copies(data)
+    total_pages = sum(page_copies(data) for data in pages_data)
+
+    forms = {}
+    page_no = 0
+    for key, data in zip(keys, pages_data):
+        label = data.get('label', {})
+        pw = label.get('width', 100) * mm
+        ph = label.get('height', 100) * mm
+        if uses[key] > 1 and key not in forms:
+            forms[key] = f'label{len(forms)}'
+            begin_page_form(c, forms[key], pw, ph)
+            draw_page(c, data, key)
+            c.endForm()
+        for _ in range(page_copies(data)):
+            c.setPageSize((pw, ph))
+            if key in forms:
+                c.doForm(forms[key])
+            else:
+                draw_page(c, data, key)
+            page_no += 1
+            if page_no < total_pages:
+                c.showPage()
+
+
+def compile_page(data, flavor, outlined=False, slot_of=None):
+    """Compile one page payload into {'layers': [{'name', 'ops'}, ...]}, bottom layer first.
+
+    slot_of(comp) may return a slot number for components to leave out: they
+    compile to ('slot', number) outside any rotation, to be filled per page
+    with compile_component() (see label_template).
+
+    Ops are tuples:
+        ('rotate', cx, cy, angle)   saveState and rotate about (cx, cy)
+        ('restore',)                restoreState
+        ('path', segments, fill, stroke, line_width, fill_mode, round_joins)
+        ('rects', rgb, [x, y, w, h, ...])          rectangles filled as one path
+        ('text', font_name, font_size, rgb, [(x, y, line), ...])
+        ('dashed_rects', [x, y, w, h, ...])        bounds rect borders
+        ('slot', number)            placeholder left by slot_of (not replayable)
+    """
+    if flavor not in FLAVORS:
+        raise ValueError(f"Unknown display list flavor '{flavor}'")
+    label = data.get('label', {})
+    page_w = label.get('width', 100) * mm
+    page_h = label.get('height', 100) * mm
+    components = data.get('components', [])
+    bounds_rects = data.get('boundsRects', [])
+
+    def compile_one(comp):
+        return _compile_component(comp, page_h, flavor, outlined)
+
+    def layer(name, comps):
+        return {'name': name, 'ops': _compile_runs(comps, bounds_rects, page_h, compile_one, slot_of)}
+
+    if flavor == 'ai' and data.get('separateInvisible', False):
+        # Separate components by type for proper z-order
+        visible_paths = []
+        hidden_paths = []
+        layer_text = []  # Text from document tree
+        manual_overlays = []  # User-created overlays (via "+") - go to bottom
+        auto_overlays = []    # Auto-created overlays from JSON - go to top
+
+        for comp in components:
+            comp_type = comp.get('type')
+            if comp_type == 'pdfpath':
+                if comp.get('visible', True):
+                    visible_paths.append(comp)
+                else:
+                    hidden_paths.append(comp)
+            elif comp_type == 'text':
+                layer_text.append(comp)
+            elif comp_type in ('textregion', 'imageregion', 'qrcoderegion', 'barcoderegion'):
+                if comp.get('autoFromText', False):
+                    auto_overlays.append(comp)
+                else:
+                    manual_overlays.append(comp)
+
+        print(f"DEBUG: hidden_paths={len(hidden_paths)}, visible_paths={len(visible_paths)}, layer_text={len(layer_text)}, manual_overlays={len(manual_overlays)}, auto_overlays={len(auto_overlays)}")
+
+        layers = [layer('manual_overlays', manual_overlays), layer('hidden_paths', hidden_paths)]
+        if hidden_paths and visible_paths:
+            # Thin red filled rectangle outside the artboard (to the right)
+            # marks the hidden/visible boundary
+            segments = [('m', page_w + 5, 0), ('l', page_w + 5.5, 0), ('l', page_w + 5.5, page_h),
+                        ('l', page_w + 5, page_h), ('h',)]
+            layers.append({'name': 'separator',
+                           'ops': [('path', segments, (1, 0, 0), None, 0, None, False)]})
+        layers += [layer('visible_paths', visible_paths), layer('layer_text', layer_text),
+                   layer('auto_overlays', auto_overlays)]
+    else:
+        # Normal export: every component in payload order (including invisible ones)
+        layers = [layer('components', components)]
+
+    if flavor == 'ai' and bounds_rects:
+        rects = []
+        for br in bounds_rects:
+            rects += [br['x'] * mm, page_h - (br['y'] + br['h']) * mm, br['w'] * mm, br['h'] * mm]
+        layers.append({'name': 'bounds_rects', 'ops': [('dashed_rects', rects)]})
+
+    return {'layers': layers}
+
+
+def compile_component(data, comp, flavor, outlined=False):
+    """Ops drawing a single component of a page payload, with its rotations"""
+    page_h = data.get('label', {}).get('height', 100) * mm
+    return _compile_runs([comp], data.get('boundsRects', []), page_h,
+                         lambda one: _compile_component(one, page_h, flavor, outlined))
+
+
+def replay(c, display_list):
+    """Emit a compiled display list onto a ReportLab canvas"""
+    for layer in display_list['layers']:
+        replay_ops(c, layer['ops'])
+
+
+def replay_ops(c, ops):
+    """Emit a sequence of display list ops onto a ReportLab canvas"""
+    for op in ops:
+        kind = op[0]
+        if kind == 'path':
+            _emit_path(c, *op[1:])
+        elif kind == 'rects':
+            _, rgb, rects = op
+            c.setFillColorRGB(*rgb)
+            p = c.beginPath()
+            for i in range(0, len(rects), 4):
+                p.rect(rects[i], rects[i + 1], rects[i + 2], rects[i + 3])
+            c.drawPath(p, fill=1, stroke=0)
+        elif kind == 'text':
+            _, font_name, font_size, rgb, lines = op
+            c.setFont(font_name, font_size)
+            c.setFillColorRGB(*rgb)
+            for x, y, line in lines:
+                c.drawString(x, y, line)
+        elif kind == 'rotate':
+            _, cx, cy, angle = op
+            c.saveState()
+            c.translate(cx, cy)
+            c.rotate(angle)  # PDF CCW positive matches canvas CW positive (Y flipped)
+            c.translate(-cx, -cy)
+        elif kind == 'restore':
+            c.restoreState()
+        elif kind == 'dashed_rects':
+            rects = op[1]
+            c.saveState()
+            c.setStrokeColorRGB(0, 0, 0)  # black like canvas
+            c.setLineWidth(0.3 * mm)
+            c.setDash(1.5 * mm, 1 * mm)
+            for i in range(0, len(rects), 4):
+                c.rect(rects[i], rects[i + 1], rects[i + 2], rects[i + 3], fill=0, stroke=1)
+            c.restoreState()
+
+
+def _emit_path(c, segments, fill, stroke, line_width, fill_mode, round_joins):
+    if round_joins:
+        c.setLineCap(1)  # Round cap
+        c.setLineJoin(1)  # Round join
+    p = c.beginPath()
+    for seg in segments:
+        op = seg[0]
+        if op == 'l':
+            p.lineTo(seg[1], seg[2])
+        elif op == 'c':
+            p.curveTo(seg[1], seg[2], seg[3], seg[4], seg[5], seg[6])
+        elif op == 'm':
+            p.moveTo(seg[1], seg[2])
+        else:
+            p.close()
+
+    if fill:
+        c.setFillColorRGB(*fill)
+    if stroke:
+        c.setStrokeColorRGB(*stroke)
+        c.setLineWidth(line_width)
+
+    if fill and stroke:
+        c.drawPath(p, fill=1, stroke=1, fillMode=fill_mode)
+    elif fill:
+        c.drawPath(p, fill=1, stroke=0, fillMode=fill_mode)
+    elif stroke:
+        c.drawPath(p, fill=0, stroke=1)
+
+
+def _compile_runs(comps, bounds_rects, page_h, compile_component, slot_of=None):
+    """Compile components in order, entering a bounds rect's rotation once per run.
+
+    Consecutive components in the same rotated bounds rect share one
+    rotate/restore pair; only an overlay's own rotation is applied per
+    component. Draw order (z-order) is unchanged. A slot ends the current
+    run, so the ops between slots are always balanced.
+    """
+    ops = []
+    current = None
+    for comp in comps:
+        slot = slot_of(comp) if slot_of else None
+        if slot is not None:
+            if current is not None:
+                ops.append(('restore',))
+                current = None
+            ops.append(('slot', slot))
+            continue
+        br_idx = _rotated_bounds_rect(comp, bounds_rects)
+        if br_idx != current:
+            if current is not None:
+                ops.append(('restore',))
+            if br_idx is not None:
+                br = bounds_rects[br_idx]
+                # Rotate around bounds rect center (in PDF coords)
+                ops.append(('rotate', (br['x'] + br['w'] / 2) * mm,
+                            page_h - (br['y'] + br['h'] / 2) * mm, br['rotation']))
+            current = br_idx
+
+        ov_rot = comp.get('rotation', 0)
+        if ov_rot != 0:
+            # Rotate around overlay center (in PDF coords)
+            ops.append(('rotate', (comp.get('x', 0) + comp.get('width', 0) / 2) * mm,
+                        page_h - (comp.get('y', 0) + comp.get('height', 0) / 2) * mm, ov_rot))
+        ops += compile_component(comp)
+        if ov_rot != 0:
+            ops.append(('restore',))
+    if current is not None:
+        ops.append(('restore',))
+    return ops
+
+
+def _compile_component(comp, page_h, flavor, outlined):
+    comp_type = comp.get('type')
+    if comp_type == 'pdfpath':
+        return _compile_path(comp, page_h, flavor)
+    if comp_type in ('text', 'textregion'):
+        return _compile_text(comp, page_h, flavor, outlined)
+    if comp_type in ('barcoderegion', 'qrcoderegion'):
+        return _compile_barcode_or_qr(comp, page_h)
+    # imageregion would go here if implemented
+    return []
+
+
+def _rotated_bounds_rect(comp, bounds_rects):
+    """Index of the component's bounds rect if that rect is rotated, else None"""
+    br_idx = comp.get('boundsRectIdx', -1)
+    if 0 <= br_idx < len(bounds_rects) and bounds_rects[br_idx].get('rotation', 0) != 0:
+        return br_idx
+    return None
+
+
+def _path_segments(ops, page_h, close_open=False):
+    """Payload path ops (mm, y down) as segments in PDF points.
+
+    close_open closes a subpath left open before the next moveTo and at the end.
+    """
+    segments = []
+    sub_path_open = False
+    for op in ops:
+        o = op.get('o')
+        a = op.get('a', [])
+        if o == 'M' and len(a) >= 2:
+            if close_open and sub_path_open:
+                segments.append(('h',))
+            segments.append(('m', a[0] * mm, page_h - (a[1] * mm)))
+            sub_path_open = True
+        elif o == 'L' and len(a) >= 2:
+            segments.append(('l', a[0] * mm, page_h - (a[1] * mm)))
+        elif o == 'C' and len(a) >= 6:
+            segments.append(('c', a[0] * mm, page_h - (a[1] * mm),
+                             a[2] * mm, page_h - (a[3] * mm),
+                             a[4] * mm, page_h - (a[5] * mm)))
+        elif o == 'Z':
+            segments.append(('h',))
+            sub_path_open = False
+    if close_open and sub_path_open:
+        segments.append(('h',))
+    return segments
+
+
+def _compile_path(comp, page_h, flavor):
+    """PDF path component"""
+    path_data = comp.get('pathData', {})
+    ops = path_data.get('ops', [])
+    fill = path_data.get('fill')
+    stroke = path_data.get('stroke')
+    lw = path_data.get('lw', 0.5)
+    if not ops:
+        return []
+    round_joins = flavor == 'ai'
+    if not fill and not stroke and not round_joins:
+        return []
+    # Use the original fill rule from the PDF (even-odd vs non-zero winding)
+    fill_mode = 0 if comp.get('isEvenOdd', False) else None
+    return [('path', _path_segments(ops, page_h, close_open=flavor == 'pdf'),
+             tuple(fill[:3]) if fill else None, tuple(stroke[:3]) if stroke else None,
+             lw * mm, fill_mode, round_joins)]
+
+
+def _compile_text(comp, page_h, flavor, outlined=False):
+    """Text component: outlined paths (AI only) or positioned lines in a resolved font"""
+    if not comp.get('content', ''):
+        return []
+    if flavor == 'pdf':
+        return _compile_text_pdf(comp, page_h)
+    if outlined:
+        try:
+            return _compile_text_outlined(comp, page_h)
+        except Exception as e:
+            # Fallback to regular text if outlining fails
+            print(f"Warning: Text outlining failed, using regular text: {e}")
+    return _compile_text_ai(comp, page_h)
+
+
+def _compile_text_pdf(comp, page_h):
+    """Text with alignment, multi-line and custom fonts (PDF baseline model)"""
+    content = comp.get('content', '')
+    x = comp.get('x', 0) * mm
+    w = comp.get('width', 0) * mm
+    h = comp.get('height', 0) * mm
+    font_size = comp.get('fontSize', 12)
+    letter_spacing = comp.get('letterSpacing', 0)
+    align_h = comp.get('alignH', 'left')
+    align_v = comp.get('alignV', 'top')
+
+    font_name = _cached_font('pdf', comp.get('fontFamily', 'Helvetica'), comp.get('fontId'))
+
+    lines = content.split('\n')
+    line_height = font_size * 1.2 + letter_spacing
+    total_text_h = len(lines) * line_height
+    comp_y = comp.get('y', 0) * mm
+
+    # Vertical alignment
+    if align_v == 'bottom':
+        first_line_y = page_h - comp_y - h + (total_text_h - line_height) + (font_size * 0.2)
+    elif align_v == 'center':
+        first_line_y = page_h - comp_y - (h / 2) - (total_text_h / 2) + (font_size * 0.2) + (total_text_h - line_height)
+    else:  # top
+        first_line_y = page_h - comp_y - (font_size * 0.8)
+
+    placed = []
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+        y = first_line_y - (i * line_height)
+        placed.append((_aligned_x(line, font_name, font_size, align_h, x, x + w / 2, x + w), y, line))
+    return [('text', font_name, font_size, _hex_to_rgb(comp.get('color', '#000000')), placed)]
+
+
+def _compile_text_ai(comp, page_h):
+    """Editable text (embedded font) with baselines from the font's real ascent"""
+    content = comp.get('content', '')
+    x = comp.get('x', 0) + comp.get('groupOffsetX', 0)
+    y = comp.get('y', 0) + comp.get('groupOffsetY', 0)
+    w = comp.get('width', 0)
+    h = comp.get('height', 0)
+    font_family = comp.get('fontFamily', 'Helvetica')
+    font_size = comp.get('fontSize', 12)
+    font_style = comp.get('fontStyle') or comp.get('aiFontStyle') or ''
+    align_h = comp.get('alignH', 'left')
+
+    font_name, _ = _cached_font('ai', font_family, comp.get('fontId'), font_style)
+
+    lines = content.split('\n')
+    first_baseline_y, line_height_mm = _first_baseline(comp, font_family, y, h, len(lines))
+
+    placed = []
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+        baseline_y = first_baseline_y + i * line_height_mm
+        placed.append((_aligned_x(line, font_name, font_size, align_h,
+                                  x * mm, (x + w / 2) * mm, (x + w) * mm),
+                       page_h - (baseline_y * mm), line))
+    return [('text', font_name, font_size, _hex_to_rgb(comp.get('color', '#000000')), placed)]
+
+
+def _compile_text_outlined(comp, page_h):
+    """Text as one even-odd filled path of glyph outlines"""
+    from fonttools_outline import text_to_path, get_text_width
+
+    content = comp.get('content', '')
+    # Use position if available (baseline anchor), otherwise fall back to bounds
+    if comp.get('position'):
+        x = comp['position'].get('x', 0)
+        y = comp['position'].get('y', 0)
+    else:
+        x = comp.get('x', 0)
+        y = comp.get('y', 0)
+    w = comp.get('width', 0)
+    h = comp.get('height', 0)
+    font_family = comp.get('fontFamily', 'Helvetica')
+    font_size = comp.get('fontSize', 12)
+    align_h = comp.get('alignH', 'left')
+
+    lines = content.split('\n')
+    first_baseline_y, line_height_mm = _first_baseline(comp, font_family, y, h, len(lines))
+
+    path_ops = []
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+        baseline_y = first_baseline_y + i * line_height_mm
+        # Adjust X for horizontal alignment per line
+        if align_h == 'center':
+            start_x = x + (w - get_text_width(line, font_family, font_size)) / 2
+        elif align_h == 'right':
+            start_x = x + w - get_text_width(line, font_family, font_size)
+        else:
+            start_x = x
+        path_ops += text_to_path(line, font_family, font_size, start_x, baseline_y)
+
+    return [('path', _path_segments(path_ops, page_h), _hex_to_rgb(comp.get('color', '#000000')),
+             None, 0, 0, False)]  # even-odd fill for correct winding
+
+
+def _first_baseline(comp, font_family, y, h, line_count):
+    """(first baseline y, line height) in mm, matching the canvas text layout"""
+    font_size = comp.get('fontSize', 12)
+    letter_spacing = comp.get('letterSpacing', 0)
+    align_v = comp.get('alignV', 'top')
+    line_height_mm = font_size * 0.3528 * 1.2 + letter_spacing * 0.3528  # match canvas: fontSizeMm * 1.2 + letterSpacing * PT_TO_MM
+    total_text_h = line_count * line_height_mm
+
+    # Baseline offset from the top of the bounds using the font's real ascent.
+    # ReportLab's drawString does not apply a descent offset, so none is compensated.
+    ascent = _cached_ascent(font_family)
+    baseline_offset_mm = font_size * 0.3528 * (ascent if ascent is not None else 0.8)
+
+    if align_v == 'bottom':
+        return y + h - total_text_h + baseline_offset_mm, line_height_mm
+    if align_v == 'center':
+        return y + (h - total_text_h) / 2 + baseline_offset_mm, line_height_mm
+    return y + baseline_offset_mm, line_height_mm
+
+
+def _aligned_x(line, font_name, font_size, align_h, left, center, right):
+    """Start x of a line for drawString, as drawCentredString/drawRightString would place it"""
+    if align_h == 'center':
+        return center - pdfmetrics.stringWidth(line, font_name, font_size) / 2.0
+    if align_h == 'right':
+        return right - pdfmetrics.stringWidth(line, font_name, font_size)
+    return left
+
+
+def _compile_barcode_or_qr(comp, page_h):
+    """Barcode or QR code as vector rects; runs of dark modules become one rect"""
+    comp_type = comp.get('type')
+    x = comp.get('x', 0) * mm
+    w = comp.get('width', 0) * mm
+    h = comp.get('height', 0) * mm
+    y = page_h - comp.get('y', 0) * mm - h  # PDF Y-axis flip
+    rgb = _hex_to_rgb(comp.get('color', '#000000'))
+
+    if comp_type == 'qrcoderegion':
+        qr_data = comp.get('qrData', '')
+        if not qr_data:
+            return []
+        try:
+            import qrcode
+            qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=1, border=0)
+            qr.add_data(qr_data)
+            qr.make(fit=True)
+            mc = qr.modules_count
+            cw = w / mc
+            ch = h / mc
+            rects = []
+            for row in range(mc):
+                ry = y + h - (row + 1) * ch  # flip row order
+                for start, length in _dark_runs(qr.modules[row]):
+                    rects += [x + start * cw, ry, length * cw, ch]
+            # White background, then the coloured modules
+            return [('rects', (1, 1, 1), [x, y, w, h]), ('rects', rgb, rects)]
+        except Exception as e:
+            print(f"Warning: Could not render QR code: {e}")
+            return []
+
+    barcode_data = comp.get('barcodeData', '')
+    barcode_format = comp.get('barcodeFormat', 'code128')
+    if not barcode_data:
+        return []
+    try:
+        import barcode as python_barcode
+        fmt_map = {
+            'code128': 'code128',
+            'ean13': 'ean13',
+            'code39': 'code39',
+            'upc': 'upca'
+        }
+        fmt = fmt_map.get(barcode_format, 'code128')
+        bc_class = python_barcode.get_barcode_class(fmt)
+        encoded = bc_class(barcode_data).build()
+        if not encoded:
+            return []
+        bars = ''.join(encoded)
+        if not bars:
+            return []
+        bar_w = w / len(bars)
+        rects = []
+        for start, length in _dark_runs([bit == '1' for bit in bars]):
+            rects += [x + start * bar_w, y, length * bar_w, h]
+        return [('rects', (1, 1, 1), [x, y, w, h]), ('rects', rgb, rects)]
+    except Exception as e:
+        print(f"Warning: Could not render barcode: {e}")
+        return []
+
+
+def _dark_runs(modules):
+    """(start, length) of each run of consecutive dark modules"""
+    runs = []
+    start = None
+    for i, dark in enumerate(modules):
+        if dark and start is None:
+            start = i
+        elif not dark and start is not None:
+            runs.append((start, i - start))
+            start = None
+    if start is not None:
+        runs.append((start, len(modules) - start))
+    return runs
+
+
+def _cached_font(flavor, font_family, font_id=None, font_style=''):
+    """Resolve a component's font at most once per flavor and font until the fonts table changes"""
+    key = (flavor, font_family, str(font_id) if font_id else None, font_style)
+    resolved = _font_cache.get(key)
+    if resolved is None:
+        if flavor == 'pdf':
+            resolved = _resolve_font_pdf(font_family, font_id)
+        else:
+            resolved = _resolve_font_ai(font_family, font_id, font_style)
+        _font_cache[key] = resolved
+    return resolved
+
+
+def _cached_ascent(font_family):
+    """Ascent of a family's font file as a fraction of the em, or None if unavailable"""
+    key = ('ascent', font_family)
+    if key not in _font_cache:
+        ascent = None
+        try:
+            from fonttools_outline import _get_font_path
+            from fontTools.ttLib import TTFont as FTFont
+
+            font_path = _get_font_path(font_family)
+            if font_path and os.path.exists(font_path):
+                font = FTFont(font_path)
+                ascent = font['hhea'].ascent / font['head'].unitsPerEm
+                font.close()
+        except Exception:
+            ascent = None
+        _font_cache[key] = ascent
+    return _font_cache[key]
+
+
+def _resolve_font_pdf(font_family, font_id=None):
+    """Register custom font if available, return resolved font name"""
+    from models.font import Font
+
+    try:
+        uploaded_font = None
+        if font_id:
+            uploaded_font = Font.get_by_id(int(font_id))
+        if not uploaded_font and font_family:
+            uploaded_font = Font.get_by_name(font_family)
+
+        if uploaded_font:
+            file_path = _font_file_path(uploaded_font)
+            if os.path.exists(file_path):
+                reg_name = uploaded_font['font_name'] or font_family
+                try:
+                    pdfmetrics.getFont(reg_name)
+                    return reg_name
+                except:
+                    pass
+                try:
+                    font = TTFont(reg_name, file_path)
+                    font.substitutionFonts = []
+                    pdfmetrics.registerFont(font)
+                    return reg_name
+                except Exception as e:
+                    print(f"Warning: Could not register font {reg_name}: {e}")
+    except Exception as e:
+        print(f"Warning: Could not check uploaded fonts: {e}")
+
+    return STANDARD_FONTS.get(font_family, 'Helvetica')
+
+
+def _resolve_font_ai(font_family, font_id=None, font_style=''):
+    """
+    Register custom font with ReportLab if available, under the name Illustrator matches
+    Returns: (font_name, is_custom) tuple
+    """
+    from models.font import Font
+
+    def _normalize_font_name(name):
+        if not name:
+            return ''
+        return re.sub(r'[\s\-_]+', '', str(name).lower())
+
+    def _find_uploaded_font_by_name(font_name):
+        if not font_name:
+            return None
+
+        # Exact lookup first
+        exact = Font.get_by_name(font_name)
+        if exact:
+            return exact
+
+        # Normalized lookup fallback
+        target = _normalize_font_name(font_name)
+        if not target:
+            return None
+
+        for f in Font.get_all():
+            n = _normalize_font_name(f.get('font_name', ''))
+            if n and n == target:
+                return f
+        return None
+
+    def _build_font_name_candidates(family, style):
+        candidates = []
+        fam = (family or '').strip()
+        sty = (style or '').strip()
+        if fam and sty and sty.lower() != 'regular':
+            candidates.append(f"{fam} {sty}")
+            candidates.append(f"{fam}-{sty}")
+            candidates.append(f"{fam}{sty}")
+        if fam:
+            candidates.append(fam)
+        # Deduplicate while preserving order
+        uniq = []
+        seen = set()
+        for c in candidates:
+            key = _normalize_font_name(c)
+            if key and key not in seen:
+                seen.add(key)
+                uniq.append(c)
+        return uniq
+
+    try:
+        uploaded_font = None
+
+        # Try by ID first (most reliable)
+        if font_id:
+            uploaded_font = Font.get_by_id(int(font_id))
+
+        # Fallback to robust name lookup (include style variants)
+        if not uploaded_font and font_family:
+            for candidate in _build_font_name_candidates(font_family, font_style):
+                uploaded_font = _find_uploaded_font_by_name(candidate)
+                if uploaded_font:
+                    break
+
+        if uploaded_font:
+            file_path = _font_file_path(uploaded_font)
+            if os.path.exists(file_path):
+                # Read font's full name from font file for Illustrator compatibility
+                reg_name = uploaded_font['font_name'] or font_family
+                try:
+                    from fontTools.ttLib import TTFont as FTFont
+                    ft_font = FTFont(file_path)
+                    full_name = None
+                    ps_name = None
+                    for record in ft_font['name'].names:
+                        if record.nameID == 4 and record.platformID == 3:  # Full name (Windows)
+                            try:
+                                full_name = record.toUnicode()
+                            except:
+                                pass
+                        elif record.nameID == 6 and record.platformID == 3:  # PostScript name
+                            try:
+                                ps_name = record.toUnicode()
+                            except:
+                                pass
+                    ft_font.close()
+                    # Prefer full name (matches local installed font), fallback to PostScript name
+                    if full_name:
+                        reg_name = full_name
+                    elif ps_name:
+                        reg_name = ps_name
+                except Exception as e:
+                    print(f"Warning: Could not read font name: {e}")
+
+                # Check if already registered
+                try:
+                    pdfmetrics.getFont(reg_name)
+                    return (reg_name, True)
+                except:
+                    pass
+
+                # Register TTF with ReportLab
+                try:
+                    font = TTFont(reg_name, file_path)
+                    font.substitutionFonts = []
+                    pdfmetrics.registerFont(font)
+                    print(f"Font registered: {reg_name} from {file_path}")
+                    return (reg_name, True)
+                except Exception as e:
+                    print(f"Warning: Could not register font {reg_name}: {e}")
+            else:
+                print(f"Warning: Font file not found: {file_path}")
+    except Exception as e:
+        print(f"Warning: Could not check uploaded fonts: {e}")
+
+    # Prefer preserving the requested font name so Illustrator can resolve/missing-font prompt
+    if font_family:
+        try:
+            from reportlab.pdfbase.pdfmetrics import Font as RLFont
+            # Register an alias with requested name backed by Helvetica metrics for PDF generation
+            try:
+                pdfmetrics.getFont(font_family)
+            except:
+                pdfmetrics.registerFont(RLFont(font_family, 'Helvetica', 'WinAnsiEncoding'))
+            return (font_family, False)
+        except Exception:
+            pass
+
+    return (STANDARD_FONTS.get(font_family, 'Helvetica'), False)
+
+
+def _font_file_path(uploaded_font):
+    """Absolute, forward-slashed path of an uploaded font's file (ReportLab needs forward slashes on Windows)"""
+    file_path = uploaded_font['file_path']
+    if not os.path.isabs(file_path):
+        file_path = os.path.join(os.path.dirname(__file__), '..', file_path)
+    return os.path.normpath(file_path).replace('\\', '/')
+
+
+def _hex_to_rgb(hex_color):
+    """Convert hex color string to RGB tuple (0-1 range)"""
+    hex_color = hex_color.lstrip('#')
+    if len(hex_color) != 6:
+        return (0, 0, 0)
+    r = int(hex_color[0:2], 16) / 255.0
+    g = int(hex_color[2:4], 16) / 255.0
+    b = int(hex_color[4:6], 16) / 255.0
+    return (r, g, b)
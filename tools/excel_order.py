@@ -1,10 +1,17 @@
 """Excel template generation, dummy data, and upload parsing for orders."""
 import openpyxl
-import tempfile
-import os
+import csv
+import io
 import random
 
-TMP_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.tmp')
+from artifact_store import artifacts
+
+# Streamed imports report at most this many row errors
+MAX_REPORTED_ERRORS = 20
+
+# Accepted upload formats; csv/tsv skip openpyxl entirely
+UPLOAD_EXTENSIONS = ('xlsx', 'csv', 'tsv')
+CSV_DELIMITERS = {'csv': ',', 'tsv': '\t'}
 
 
 def generate_template(variables):
@@ -14,23 +21,19 @@ def generate_template(variables):
     Returns:
         filepath to the generated .xlsx in .tmp/
     """
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Data"
-    for col_idx, var in enumerate(variables, start=1):
-        ws.cell(row=1, column=col_idx, value=var['content'])
-    ws.cell(row=1, column=len(variables) + 1, value='qty')
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Data")
+    ws.append(_header_row(variables))
 
     _write_metadata(wb, variables)
 
-    fd, filepath = tempfile.mkstemp(suffix='.xlsx', dir=TMP_DIR)
-    os.close(fd)
-    wb.save(filepath)
-    return filepath
+    return _save(wb)
 
 
 def generate_dummy(variables, row_count=10):
     """Generate an xlsx with random placeholder data rows.
+    Rows are streamed to disk (write-only workbook), so memory stays flat
+    regardless of row_count.
     Args:
         variables: list of dicts [{idx: int, content: str}, ...]
         row_count: number of dummy rows to generate
@@ -38,41 +41,69 @@ def generate_dummy(variables, row_count=10):
         filepath to the generated .xlsx in .tmp/
     """
     num_rows = max(1, int(row_count))
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Data"
-
-    for col_idx, var in enumerate(variables, start=1):
-        ws.cell(row=1, column=col_idx, value=var['content'])
-    ws.cell(row=1, column=len(variables) + 1, value='qty')
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Data")
+    ws.append(_header_row(variables))
 
-    for row in range(2, num_rows + 2):
-        for col_idx, var in enumerate(variables, start=1):
-            ws.cell(row=row, column=col_idx, value=_random_placeholder(var['content']))
-        ws.cell(row=row, column=len(variables) + 1, value=random.randint(1, 50))
+    makers = [_placeholder_maker(var['content']) for var in variables]
+    randint = random.randint
+    for _ in range(num_rows):
+        row = [make() for make in makers]
+        row.append(randint(1, 50))
+        ws.append(row)
 
     _write_metadata(wb, variables)
 
-    fd, filepath = tempfile.mkstemp(suffix='.xlsx', dir=TMP_DIR)
-    os.close(fd)
+    return _save(wb)
+
+
+def _header_row(variables):
+    return [var['content'] for var in variables] + ['qty']
+
+
+def _save(wb):
+    filepath = artifacts.stage('.xlsx')
     wb.save(filepath)
-    return filepath
+    return artifacts.commit(filepath)
 
 
-def parse_upload(file_storage, expected_variables):
-    """Parse and validate an uploaded xlsx file.
+class UploadError(Exception):
+    """The upload as a whole is unusable (bad header, no data rows)"""
+
+
+def upload_extension(filename):
+    """Lower-case extension of an upload's filename ('' if none)"""
+    return filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+
+
+def open_upload(filename, source, expected_variables):
+    """Validate an upload row by row, choosing the reader from the filename's extension.
+    Returns the same iterator as iter_upload_rows / iter_csv_rows.
+    """
+    ext = upload_extension(filename)
+    if ext in CSV_DELIMITERS:
+        return iter_csv_rows(source, expected_variables, CSV_DELIMITERS[ext])
+    return iter_upload_rows(source, expected_variables)
+
+
+def iter_upload_rows(source, expected_variables):
+    """Validate an xlsx row by row, reading it straight from source.
+    The header is checked immediately; data rows are validated lazily.
     Args:
-        file_storage: werkzeug FileStorage object
+        source: path or seekable file object (e.g. the upload stream)
         expected_variables: list of dicts [{idx: int, content: str}, ...]
     Returns:
-        dict with 'success' and 'rows' or 'error'
+        iterator of (row_number, row, error): row is {'variableValues': {...},
+        'quantity': int} for a valid row, otherwise None with error set
+    Raises:
+        UploadError for an unreadable file or bad header (and, while
+        iterating, when there are no data rows)
     """
-    fd, filepath = tempfile.mkstemp(suffix='.xlsx', dir=TMP_DIR)
-    os.close(fd)
-    file_storage.save(filepath)
-
     try:
-        wb = openpyxl.load_workbook(filepath, read_only=True)
+        wb = openpyxl.load_workbook(source, read_only=True)
+    except Exception as e:
+        raise UploadError(f'Could not read workbook: {e}')
+    try:
         ws = wb['Data'] if 'Data' in wb.sheetnames else wb.active
 
         # Read metadata for index mapping
@@ -80,77 +111,171 @@ def parse_upload(file_storage, expected_variables):
         if not idx_mapping:
             idx_mapping = [v['idx'] for v in expected_variables]
 
-        # Validate column count (variables + optional qty)
-        header_row = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-        actual_cols = len([h for h in header_row if h is not None and str(h).strip() != ''])
-        expected_cols_no_qty = len(expected_variables)
-        expected_cols_with_qty = len(expected_variables) + 1
-        has_qty = actual_cols == expected_cols_with_qty
-        if actual_cols != expected_cols_with_qty and actual_cols != expected_cols_no_qty:
-            return {'success': False, 'error': f'Column count mismatch: expected {expected_cols_no_qty} or {expected_cols_with_qty}, got {actual_cols}'}
-
-        # Validate no empty headers
-        for i, h in enumerate(header_row[:actual_cols]):
-            if h is None or str(h).strip() == '':
-                return {'success': False, 'error': f'Empty header in column {i + 1}'}
-
-        # Read data rows and validate
-        var_cols = len(expected_variables)
-        rows = []
-        prev_was_empty = False
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            values = list(row[:actual_cols])
-            is_empty = all(v is None or str(v).strip() == '' for v in values)
-
-            if is_empty:
-                if rows:
-                    prev_was_empty = True
-                continue
+        header_row = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1), ())]
+        actual_cols, has_qty = _check_header(header_row, expected_variables)
+    except BaseException:
+        wb.close()
+        raise
+    return _validate_rows(_workbook_rows(wb, ws), idx_mapping, len(expected_variables), actual_cols, has_qty)
+
 
-            if prev_was_empty:
-                return {'success': False, 'error': 'Empty rows between data rows are not allowed'}
-
-            for ci, v in enumerate(values):
-                if v is None or str(v).strip() == '':
-                    return {'success': False, 'error': f'Empty cell at row {len(rows) + 2}, column {ci + 1}'}
-
-            vv = {}
-            for ci in range(var_cols):
-                vv[str(idx_mapping[ci])] = str(values[ci])
-            if has_qty:
-                qty_val = values[var_cols]
-                try:
-                    qty = int(float(str(qty_val)))
-                except (ValueError, TypeError):
-                    return {'success': False, 'error': f'Invalid qty at row {len(rows) + 2}: {qty_val}'}
-                if qty < 1:
-                    return {'success': False, 'error': f'Qty must be >= 1 at row {len(rows) + 2}'}
-            else:
-                qty = 1
-            rows.append({'variableValues': vv, 'quantity': qty})
-
-        if not rows:
-            return {'success': False, 'error': 'No data rows found'}
-
-        return {'success': True, 'rows': rows}
+def iter_csv_rows(source, expected_variables, delimiter=','):
+    """Validate a CSV/TSV upload row by row with the same rules as iter_upload_rows.
+    There is no _metadata sheet, so columns map to expected_variables in order.
+    Args:
+        source: path or binary file object (e.g. the upload stream)
+        expected_variables: list of dicts [{idx: int, content: str}, ...]
+        delimiter: ',' for CSV, '\\t' for TSV
+    """
+    if isinstance(source, str):
+        source = open(source, 'rb')
+    # utf-8-sig drops the BOM Excel puts in front of "CSV UTF-8" exports
+    text = io.TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text, delimiter=delimiter)
+    try:
+        header_row = next(reader, [])
+        actual_cols, has_qty = _check_header(header_row, expected_variables)
+    except UnicodeDecodeError as e:
+        raise UploadError(f'Could not read file: {e}')
+    idx_mapping = [v['idx'] for v in expected_variables]
+    return _validate_rows(_csv_rows(reader), idx_mapping, len(expected_variables), actual_cols, has_qty)
+
+
+def _workbook_rows(wb, ws):
+    """Data rows of a read-only sheet; closes the workbook when exhausted or dropped"""
+    try:
+        yield from ws.iter_rows(min_row=2, values_only=True)
     finally:
-        try:
-            os.unlink(filepath)
-        except OSError:
-            pass
+        wb.close()
+
+
+def _csv_rows(reader):
+    try:
+        yield from reader
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise UploadError(f'Could not read file at line {reader.line_num}: {e}')
+
+
+def _check_header(header_row, expected_variables):
+    """Validate the header; returns (column count, whether the qty column is present)"""
+    # Validate column count (variables + optional qty)
+    actual_cols = len([h for h in header_row if h is not None and str(h).strip() != ''])
+    expected_cols_no_qty = len(expected_variables)
+    expected_cols_with_qty = len(expected_variables) + 1
+    if actual_cols != expected_cols_with_qty and actual_cols != expected_cols_no_qty:
+        raise UploadError(f'Column count mismatch: expected {expected_cols_no_qty} or {expected_cols_with_qty}, got {actual_cols}')
+
+    # Validate no empty headers
+    for i, h in enumerate(header_row[:actual_cols]):
+        if h is None or str(h).strip() == '':
+            raise UploadError(f'Empty header in column {i + 1}')
+    return actual_cols, actual_cols == expected_cols_with_qty
+
+
+def _validate_rows(rows, idx_mapping, var_cols, actual_cols, has_qty):
+    """Yield (row_number, row, error) for each non-empty data row."""
+    seen_data = False
+    prev_was_empty = False
+    for row_number, row in enumerate(rows, start=2):
+        values = list(row[:actual_cols])
+        values += [None] * (actual_cols - len(values))
+        is_empty = all(v is None or str(v).strip() == '' for v in values)
+
+        if is_empty:
+            if seen_data:
+                prev_was_empty = True
+            continue
+        seen_data = True
+
+        if prev_was_empty:
+            prev_was_empty = False
+            yield row_number, None, f'Empty rows between data rows are not allowed (before row {row_number})'
+            continue
+
+        empty_col = next((ci for ci, v in enumerate(values) if v is None or str(v).strip() == ''), None)
+        if empty_col is not None:
+            yield row_number, None, f'Empty cell at row {row_number}, column {empty_col + 1}'
+            continue
+
+        vv = {}
+        for ci in range(var_cols):
+            vv[str(idx_mapping[ci])] = str(values[ci])
+        if has_qty:
+            qty_val = values[var_cols]
+            try:
+                qty = int(float(str(qty_val)))
+            except (ValueError, TypeError):
+                yield row_number, None, f'Invalid qty at row {row_number}: {qty_val}'
+                continue
+            if qty < 1:
+                yield row_number, None, f'Qty must be >= 1 at row {row_number}'
+                continue
+        else:
+            qty = 1
+        yield row_number, {'variableValues': vv, 'quantity': qty}, None
+
+    if not seen_data:
+        raise UploadError('No data rows found')
+
+
+class UploadSummary:
+    """Running totals for a streamed upload: row count, quantity and the first few errors"""
+
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.quantity = 0
+        self.error_count = 0
+        self.errors = []
+
+    def valid_rows(self, results):
+        """Pass valid rows through until the first error, but keep counting to the end"""
+        for row_number, row, error in results:
+            if error:
+                self.error_count += 1
+                if len(self.errors) < self.max_errors:
+                    self.errors.append({'row': row_number, 'error': error})
+                continue
+            self.rows += 1
+            self.quantity += row['quantity']
+            if not self.error_count:
+                yield row
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'total_quantity': self.quantity,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+def parse_upload(file_storage, expected_variables):
+    """Parse and validate an uploaded xlsx, csv or tsv file.
+    Args:
+        file_storage: werkzeug FileStorage object
+        expected_variables: list of dicts [{idx: int, content: str}, ...]
+    Returns:
+        dict with 'success' and 'rows' or 'error'
+    """
+    rows = []
+    try:
+        for _, row, error in open_upload(file_storage.filename, file_storage.stream, expected_variables):
+            if error:
+                return {'success': False, 'error': error}
+            rows.append(row)
+    except UploadError as e:
+        return {'success': False, 'error': str(e)}
+    return {'success': True, 'rows': rows}
 
 
 def _write_metadata(wb, variables):
     """Write hidden _metadata sheet with variable index mapping."""
     meta = wb.create_sheet("_metadata")
     meta.sheet_state = 'hidden'
-    meta.cell(row=1, column=1, value="col_position")
-    meta.cell(row=1, column=2, value="variable_index")
-    meta.cell(row=1, column=3, value="default_content")
-    for row_idx, var in enumerate(variables, start=2):
-        meta.cell(row=row_idx, column=1, value=row_idx - 1)
-        meta.cell(row=row_idx, column=2, value=var['idx'])
-        meta.cell(row=row_idx, column=3, value=var['content'])
+    meta.append(["col_position", "variable_index", "default_content"])
+    for position, var in enumerate(variables, start=1):
+        meta.append([position, var['idx'], var['content']])
 
 
 def _read_metadata(wb):
@@ -165,21 +290,27 @@ def _read_metadata(wb):
     return mapping if mapping else None
 
 
-def _random_placeholder(field_name):
-    """Generate contextual placeholder based on field name."""
+def _placeholder_maker(field_name):
+    """Pick a contextual placeholder generator once per column, based on field name."""
     name_lower = field_name.lower()
+    choice, randint = random.choice, random.randint
     if any(w in name_lower for w in ['name', 'first', 'last']):
-        return random.choice(['John', 'Jane', 'Alex', 'Maria', 'David', 'Sarah', 'Mike', 'Lisa'])
+        names = ['John', 'Jane', 'Alex', 'Maria', 'David', 'Sarah', 'Mike', 'Lisa']
+        return lambda: choice(names)
     if any(w in name_lower for w in ['address', 'street']):
-        return f'{random.randint(100, 9999)} {random.choice(["Main", "Oak", "Pine", "Elm"])} St'
+        streets = ["Main", "Oak", "Pine", "Elm"]
+        return lambda: f'{randint(100, 9999)} {choice(streets)} St'
     if any(w in name_lower for w in ['phone', 'tel']):
-        return f'555-{random.randint(100, 999)}-{random.randint(1000, 9999)}'
+        return lambda: f'555-{randint(100, 999)}-{randint(1000, 9999)}'
     if any(w in name_lower for w in ['email', 'mail']):
-        return f'user{random.randint(1, 99)}@example.com'
+        return lambda: f'user{randint(1, 99)}@example.com'
     if any(w in name_lower for w in ['city', 'town']):
-        return random.choice(['Springfield', 'Portland', 'Madison', 'Franklin'])
+        cities = ['Springfield', 'Portland', 'Madison', 'Franklin']
+        return lambda: choice(cities)
     if any(w in name_lower for w in ['zip', 'postal']):
-        return str(random.randint(10000, 99999))
+        return lambda: str(randint(10000, 99999))
     if any(w in name_lower for w in ['title', 'position']):
-        return random.choice(['Manager', 'Director', 'Engineer', 'Analyst'])
-    return f'Sample {field_name} {random.randint(1, 100)}'
+        titles = ['Manager', 'Director', 'Engineer', 'Analyst']
+        return lambda: choice(titles)
+    return lambda: f'Sample {field_name} {randint(1, 100)}'
+
@@ -1,31 +1,34 @@
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
 import os
-import tempfile
-import sys
-import math
 import subprocess
-import json
-import re
 
-def export_ai(data, outlined=False):
+from artifact_store import artifacts
+from display_list import draw_pages, get_display_list, page_copies, refresh_fonts, replay
+from output_profile import finalize, rendering
+
+def export_ai(data, outlined=False, profile=None):
     """
     Generate AI file (PDF-based) from component data
 
     Args:
-        data: dict with 'label' (width, height) and 'components' array
+        data: dict with 'label' (width, height) and 'components' array,
+              optional 'copies' (pages to emit, sharing one content stream)
         outlined: bool, if True convert text to paths
+        profile: output profile name, dict or OutputProfile (see output_profile)
 
     Returns:
         str: Path to generated AI file
     """
+    if page_copies(data) > 1:
+        return export_ai_batch([data], outlined, profile)
+
     label = data.get('label', {})
     page_w = label.get('width', 100) * mm
     page_h = label.get('height', 100) * mm
 
-    # Create temporary file
-    fd, filepath = tempfile.mkstemp(suffix='.ai', dir='.tmp')
-    os.close(fd)
+    # Written under a staging name, committed to the artifact store when complete
+    filepath = artifacts.stage('.ai')
 
     # Create PDF canvas (AI can open PDFs)
     c = canvas.Canvas(filepath, pagesize=(page_w, page_h))
@@ -33,132 +36,17 @@ def export_ai(data, outlined=False):
     # Set high quality rendering
     c._doc.setCompression(1)  # Enable compression but maintain quality
 
-    _draw_page(c, data, outlined, page_w, page_h)
+    refresh_fonts()
+    with rendering(profile):
+        _draw_page(c, data, outlined)
+        _save_with_fonts(c, outlined, filepath)
+    finalize(filepath, profile)
+    return artifacts.commit(filepath)
 
-    _save_with_fonts(c, outlined, filepath)
-    return filepath
 
-
-def _draw_page(c, data, outlined, page_w, page_h):
+def _draw_page(c, data, outlined, content_key=None):
     """Draw a single page of components onto the canvas."""
-    components = data.get('components', [])
-    bounds_rects = data.get('boundsRects', [])
-    separate_invisible = data.get('separateInvisible', False)
-
-    if separate_invisible:
-        # Separate components by type for proper z-order
-        visible_paths = []
-        hidden_paths = []
-        layer_text = []  # Text from document tree
-        manual_overlays = []  # User-created overlays (via "+") - go to bottom
-        auto_overlays = []    # Auto-created overlays from JSON - go to top
-
-        for comp in components:
-            comp_type = comp.get('type')
-            visible = comp.get('visible', True)
-
-            if comp_type == 'pdfpath':
-                if visible:
-                    visible_paths.append(comp)
-                else:
-                    hidden_paths.append(comp)
-            elif comp_type == 'text':
-                # Text from document tree (layer content)
-                layer_text.append(comp)
-            elif comp_type in ('textregion', 'imageregion', 'qrcoderegion', 'barcoderegion'):
-                # Separate overlays by origin
-                if comp.get('autoFromText', False):
-                    auto_overlays.append(comp)  # Auto-created from JSON - top
-                else:
-                    manual_overlays.append(comp)  # Manually created via "+" - bottom
-
-        # Debug: Print counts
-        print(f"DEBUG: hidden_paths={len(hidden_paths)}, visible_paths={len(visible_paths)}, layer_text={len(layer_text)}, manual_overlays={len(manual_overlays)}, auto_overlays={len(auto_overlays)}")
-
-        # Render order (bottom to top):
-        # 1. Manual overlays (lowest Z-index - created via "+")
-        for comp in manual_overlays:
-            _apply_rotation(c, comp, bounds_rects, page_h)
-            comp_type = comp.get('type')
-            if comp_type in ('qrcoderegion', 'barcoderegion'):
-                _draw_barcode_or_qr(c, comp, page_h)
-            elif comp_type == 'textregion':
-                if outlined:
-                    _draw_text_outlined(c, comp, page_h)
-                else:
-                    _draw_text(c, comp, page_h)
-            # imageregion would go here if implemented
-            _restore_rotation(c, comp, bounds_rects)
-
-        # 2. Hidden paths
-        for comp in hidden_paths:
-            _apply_rotation(c, comp, bounds_rects, page_h)
-            _draw_pdfpath(c, comp, page_h)
-            _restore_rotation(c, comp, bounds_rects)
-
-        # Draw red separator line (helps identify hidden/visible boundary)
-        if len(hidden_paths) > 0 and len(visible_paths) > 0:
-            print("DEBUG: Drawing red separator line")
-            # Draw a thin vertical red FILLED rectangle OUTSIDE the artboard (to the right)
-            p = c.beginPath()
-            p.moveTo(page_w + 5, 0)  # Start 5mm to the right of artboard, at top
-            p.lineTo(page_w + 5.5, 0)  # 0.5mm wide
-            p.lineTo(page_w + 5.5, page_h)  # Down to bottom
-            p.lineTo(page_w + 5, page_h)  # Back to left edge
-            p.close()  # Close the rectangle
-            c.setFillColorRGB(1, 0, 0)  # Pure red fill
-            c.drawPath(p, fill=1, stroke=0)  # Fill only, no stroke
-        else:
-            print(f"DEBUG: Skipping red line - hidden={len(hidden_paths)}, visible={len(visible_paths)}")
-
-        # 3. Visible paths (middle layer - document tree)
-        for comp in visible_paths:
-            _apply_rotation(c, comp, bounds_rects, page_h)
-            _draw_pdfpath(c, comp, page_h)
-            _restore_rotation(c, comp, bounds_rects)
-
-        # 4. Layer text (middle-top layer)
-        for comp in layer_text:
-            _apply_rotation(c, comp, bounds_rects, page_h)
-            if outlined:
-                _draw_text_outlined(c, comp, page_h)
-            else:
-                _draw_text(c, comp, page_h)
-            _restore_rotation(c, comp, bounds_rects)
-
-        # 5. Auto overlays (highest Z-index - auto-created from JSON)
-        for comp in auto_overlays:
-            _apply_rotation(c, comp, bounds_rects, page_h)
-            comp_type = comp.get('type')
-            if comp_type in ('qrcoderegion', 'barcoderegion'):
-                _draw_barcode_or_qr(c, comp, page_h)
-            elif comp_type == 'textregion':
-                if outlined:
-                    _draw_text_outlined(c, comp, page_h)
-                else:
-                    _draw_text(c, comp, page_h)
-            # imageregion would go here if implemented
-            _restore_rotation(c, comp, bounds_rects)
-    else:
-        # Normal export: draw all components (including invisible ones)
-        for comp in components:
-            comp_type = comp.get('type')
-            _apply_rotation(c, comp, bounds_rects, page_h)
-
-            if comp_type == 'pdfpath':
-                _draw_pdfpath(c, comp, page_h)
-            elif comp_type in ('text', 'textregion'):
-                if outlined:
-                    _draw_text_outlined(c, comp, page_h)
-                else:
-                    _draw_text(c, comp, page_h)
-            elif comp_type in ('barcoderegion', 'qrcoderegion'):
-                _draw_barcode_or_qr(c, comp, page_h)
-
-            _restore_rotation(c, comp, bounds_rects)
-
-    # Draw bounds rect borders (green dotted lines)
-    _draw_bounds_rects(c, bounds_rects, page_h)
+    replay(c, get_display_list(data, 'ai', outlined, content_key))
 
 
 def _save_with_fonts(c, outlined, filepath):
@@ -240,8 +128,14 @@ def _patch_font_names(filepath, font_mapping):
         # Non-fatal: export still works, just with Helvetica names
 
 
-def export_ai_batch(pages_data, outlined=False):
-    """Generate a multi-page AI file. Each item in pages_data is a single-page payload."""
+def export_ai_batch(pages_data, outlined=False, profile=None):
+    """Generate a multi-page AI file. Each item in pages_data is a single-page payload.
+
+    A payload's optional 'copies' emits that many pages. Content that appears
+    on more than one page (copies, or identical payloads) is drawn once into a
+    Form XObject and referenced from each page, so file size and render time
+    don't grow with quantity.
+    """
     if not pages_data:
         raise ValueError("No pages to export")
 
@@ -249,564 +143,13 @@ def export_ai_batch(pages_data, outlined=False):
     page_w = first_label.get('width', 100) * mm
     page_h = first_label.get('height', 100) * mm
 
-    fd, filepath = tempfile.mkstemp(suffix='.ai', dir='.tmp')
-    os.close(fd)
+    filepath = artifacts.stage('.ai')
 
     c = canvas.Canvas(filepath, pagesize=(page_w, page_h))
+    refresh_fonts()
 
-    for i, data in enumerate(pages_data):
-        label = data.get('label', {})
-        pw = label.get('width', 100) * mm
-        ph = label.get('height', 100) * mm
-        c.setPageSize((pw, ph))
-        _draw_page(c, data, outlined, pw, ph)
-        if i < len(pages_data) - 1:
-            c.showPage()
-
-    _save_with_fonts(c, outlined, filepath)
-    return filepath
-
-def _apply_rotation(c, comp, bounds_rects, page_h):
-    """Apply bounds rect rotation + overlay rotation, matching canvas logic"""
-    br_idx = comp.get('boundsRectIdx', -1)
-    br_rot = 0
-    if 0 <= br_idx < len(bounds_rects):
-        br_rot = bounds_rects[br_idx].get('rotation', 0)
-    ov_rot = comp.get('rotation', 0)
-
-    if br_rot != 0:
-        br = bounds_rects[br_idx]
-        # Rotate around bounds rect center (in PDF coords)
-        cx = (br['x'] + br['w'] / 2) * mm
-        cy = page_h - (br['y'] + br['h'] / 2) * mm
-        c.saveState()
-        c.translate(cx, cy)
-        c.rotate(br_rot)  # PDF CCW positive matches canvas CW positive (Y flipped)
-        c.translate(-cx, -cy)
-
-    if ov_rot != 0:
-        # Rotate around overlay center (in PDF coords)
-        ox = (comp.get('x', 0) + comp.get('width', 0) / 2) * mm
-        oy = page_h - (comp.get('y', 0) + comp.get('height', 0) / 2) * mm
-        c.saveState()
-        c.translate(ox, oy)
-        c.rotate(ov_rot)  # PDF CCW positive matches canvas CW positive (Y flipped)
-        c.translate(-ox, -oy)
-
-def _restore_rotation(c, comp, bounds_rects):
-    """Restore canvas state after rotation"""
-    ov_rot = comp.get('rotation', 0)
-    br_idx = comp.get('boundsRectIdx', -1)
-    br_rot = 0
-    if 0 <= br_idx < len(bounds_rects):
-        br_rot = bounds_rects[br_idx].get('rotation', 0)
-
-    if ov_rot != 0:
-        c.restoreState()
-    if br_rot != 0:
-        c.restoreState()
-
-def _draw_barcode_or_qr(c, comp, page_h):
-    """Draw barcode or QR code as vector paths (not raster)"""
-    comp_type = comp.get('type')
-    x = comp.get('x', 0) * mm
-    w = comp.get('width', 0) * mm
-    h = comp.get('height', 0) * mm
-    comp_y = comp.get('y', 0) * mm
-    y = page_h - comp_y - h  # PDF Y-axis flip
-    color_hex = comp.get('color', '#000000')
-    fr, fg, fb = _hex_to_rgb(color_hex)
-
-    if comp_type == 'qrcoderegion':
-        qr_data = comp.get('qrData', '')
-        if not qr_data:
-            return
-        try:
-            import qrcode
-            qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=1, border=0)
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            mc = qr.modules_count
-            cw = w / mc
-            ch = h / mc
-            # White background
-            c.setFillColorRGB(1, 1, 1)
-            c.rect(x, y, w, h, fill=1, stroke=0)
-            # Colored modules as vector rects
-            c.setFillColorRGB(fr, fg, fb)
-            for row in range(mc):
-                for col in range(mc):
-                    if qr.modules[row][col]:
-                        rx = x + col * cw
-                        ry = y + h - (row + 1) * ch  # flip row order
-                        c.rect(rx, ry, cw, ch, fill=1, stroke=0)
-        except Exception as e:
-            print(f"Warning: Could not render QR code: {e}")
-
-    elif comp_type == 'barcoderegion':
-        barcode_data = comp.get('barcodeData', '')
-        barcode_format = comp.get('barcodeFormat', 'code128')
-        if not barcode_data:
-            return
-        try:
-            import barcode as python_barcode
-            fmt_map = {
-                'code128': 'code128',
-                'ean13': 'ean13',
-                'code39': 'code39',
-                'upc': 'upca'
-            }
-            fmt = fmt_map.get(barcode_format, 'code128')
-            bc_class = python_barcode.get_barcode_class(fmt)
-            bc = bc_class(barcode_data)
-            encoded = bc.build()
-            if not encoded:
-                return
-            bars = ''.join(encoded)
-            num_modules = len(bars)
-            if num_modules == 0:
-                return
-            bar_w = w / num_modules
-            # White background
-            c.setFillColorRGB(1, 1, 1)
-            c.rect(x, y, w, h, fill=1, stroke=0)
-            # Colored bars as vector rects
-            c.setFillColorRGB(fr, fg, fb)
-            for i, bit in enumerate(bars):
-                if bit == '1':
-                    c.rect(x + i * bar_w, y, bar_w, h, fill=1, stroke=0)
-        except Exception as e:
-            print(f"Warning: Could not render barcode: {e}")
-
-def _draw_bounds_rects(c, bounds_rects, page_h):
-    """Draw green dotted bounds rect borders matching the web app"""
-    if not bounds_rects:
-        return
-    for br in bounds_rects:
-        x = br['x'] * mm
-        y = page_h - (br['y'] + br['h']) * mm
-        w = br['w'] * mm
-        h = br['h'] * mm
-        c.saveState()
-        c.setStrokeColorRGB(0, 0, 0)  # black like canvas
-        c.setLineWidth(0.3 * mm)
-        c.setDash(1.5 * mm, 1 * mm)
-        c.rect(x, y, w, h, fill=0, stroke=1)
-        c.restoreState()
-
-def _draw_pdfpath(c, comp, page_h):
-    """Draw PDF path component"""
-    path_data = comp.get('pathData', {})
-    ops = path_data.get('ops', [])
-    fill = path_data.get('fill')
-    stroke = path_data.get('stroke')
-    lw = path_data.get('lw', 0.5)
-    if not ops:
-        return
-
-    # Set line cap and join for smooth rendering
-    c.setLineCap(1)  # Round cap
-    c.setLineJoin(1)  # Round join
-
-    # Create path
-    p = c.beginPath()
-
-    for op in ops:
-        o = op.get('o')
-        a = op.get('a', [])
-
-        if o == 'M' and len(a) >= 2:
-            p.moveTo(a[0] * mm, page_h - (a[1] * mm))
-        elif o == 'L' and len(a) >= 2:
-            p.lineTo(a[0] * mm, page_h - (a[1] * mm))
-        elif o == 'C' and len(a) >= 6:
-            p.curveTo(
-                a[0] * mm, page_h - (a[1] * mm),
-                a[2] * mm, page_h - (a[3] * mm),
-                a[4] * mm, page_h - (a[5] * mm)
-            )
-        elif o == 'Z':
-            p.close()
-
-    # Set colors
-    if fill:
-        c.setFillColorRGB(fill[0], fill[1], fill[2])
-
-    if stroke:
-        c.setStrokeColorRGB(stroke[0], stroke[1], stroke[2])
-        c.setLineWidth(lw * mm)
-
-    # Use the original fill rule from the PDF (even-odd vs non-zero winding)
-    fill_mode = 0 if comp.get('isEvenOdd', False) else None
-    if fill and stroke:
-        c.drawPath(p, fill=1, stroke=1, fillMode=fill_mode)
-    elif fill:
-        c.drawPath(p, fill=1, stroke=0, fillMode=fill_mode)
-    elif stroke:
-        c.drawPath(p, fill=0, stroke=1)
-
-def _draw_text(c, comp, page_h):
-    """Draw text component (editable if font is embedded)"""
-    content = comp.get('content', '')
-    if not content:
-        return
-
-    x = comp.get('x', 0)
-    y = comp.get('y', 0)
-    w = comp.get('width', 0)
-    h = comp.get('height', 0)
-    group_offset_x = comp.get('groupOffsetX', 0)
-    group_offset_y = comp.get('groupOffsetY', 0)
-    x += group_offset_x
-    y += group_offset_y
-    font_family = comp.get('fontFamily', 'Helvetica')
-    font_size = comp.get('fontSize', 12)
-    font_id = comp.get('fontId', None)
-    font_style = comp.get('fontStyle') or comp.get('aiFontStyle') or ''
-    bold = comp.get('bold', False)
-    italic = comp.get('italic', False)
-    color = comp.get('color', '#000000')
-    letter_spacing = comp.get('letterSpacing', 0)
-    align_h = comp.get('alignH', 'left')
-    align_v = comp.get('alignV', 'top')
-
-    # Try to register custom font
-    resolved_font, is_custom = _register_custom_font(c, font_family, font_id, font_style)
-
-    c.setFont(resolved_font, font_size)
-
-    # Parse hex color to RGB
-    r, g, b = _hex_to_rgb(color)
-    c.setFillColorRGB(r, g, b)
-
-    # Split into lines for multi-line support
-    lines = content.split('\n')
-    line_height_mm = font_size * 0.3528 * 1.2 + letter_spacing * 0.3528  # match canvas: fontSizeMm * 1.2 + letterSpacing * PT_TO_MM
-    total_text_h = len(lines) * line_height_mm
-
-    # Get actual font metrics for accurate baseline calculation
-    # ReportLab's drawString does NOT apply descent offset, so we don't need to compensate
-    try:
-        sys.path.insert(0, os.path.dirname(__file__))
-        from fonttools_outline import _get_font_path
-        from fontTools.ttLib import TTFont
-
-        font_path = _get_font_path(font_family)
-        if font_path and os.path.exists(font_path):
-            font = TTFont(font_path)
-            units_per_em = font['head'].unitsPerEm
-            ascent = font['hhea'].ascent
-            # Calculate baseline offset from top of bounds using actual font metrics
-            baseline_offset_mm = (ascent / units_per_em) * font_size * 0.3528
-            font.close()
-        else:
-            # Fallback to approximation if font not found
-            baseline_offset_mm = font_size * 0.3528 * 0.8
-    except:
-        # Fallback to approximation if fonttools fails
-        baseline_offset_mm = font_size * 0.3528 * 0.8
-
-    # Calculate vertical start for first line baseline (match _draw_text_outlined)
-    if align_v == 'bottom':
-        first_baseline_y = y + h - total_text_h + baseline_offset_mm
-    elif align_v == 'center':
-        first_baseline_y = y + (h - total_text_h) / 2 + baseline_offset_mm
-    else:  # top
-        first_baseline_y = y + baseline_offset_mm
-
-    # Draw each line
-    for i, line in enumerate(lines):
-        baseline_y = first_baseline_y + i * line_height_mm
-        if not line:
-            continue
-        if align_h == 'center':
-            c.drawCentredString((x + w / 2) * mm, page_h - (baseline_y * mm), line)
-        elif align_h == 'right':
-            c.drawRightString((x + w) * mm, page_h - (baseline_y * mm), line)
-        else:
-            c.drawString(x * mm, page_h - (baseline_y * mm), line)
-
-def _draw_text_outlined(c, comp, page_h):
-    """Draw text as outlined paths"""
-    # Import fonttools outline converter
-    sys.path.insert(0, os.path.dirname(__file__))
-    from fonttools_outline import text_to_path, get_text_width
-
-    content = comp.get('content', '')
-    if not content:
-        return
-
-    # Use position if available (baseline anchor), otherwise fall back to bounds
-    if 'position' in comp and comp.get('position'):
-        x = comp.get('position', {}).get('x', 0)
-        y = comp.get('position', {}).get('y', 0)
-    else:
-        x = comp.get('x', 0)
-        y = comp.get('y', 0)
-
-    w = comp.get('width', 0)
-    h = comp.get('height', 0)
-    font_family = comp.get('fontFamily', 'Helvetica')
-    font_size = comp.get('fontSize', 12)
-    color = comp.get('color', '#000000')
-    align_h = comp.get('alignH', 'left')
-    align_v = comp.get('alignV', 'top')
-
-    # Split into lines for multi-line support
-    lines = content.split('\n')
-    letter_spacing = comp.get('letterSpacing', 0)
-    line_height_mm = font_size * 0.3528 * 1.2 + letter_spacing * 0.3528  # match canvas: fontSizeMm * 1.2 + letterSpacing * PT_TO_MM
-    total_text_h = len(lines) * line_height_mm
-
-    # Get actual font metrics for accurate baseline calculation
-    try:
-        font_path = _get_font_path(font_family)
-        if font_path and os.path.exists(font_path):
-            font = TTFont(font_path)
-            units_per_em = font['head'].unitsPerEm
-            ascent = font['hhea'].ascent
-            # Calculate baseline offset from top of bounds using actual font metrics
-            baseline_offset_mm = (ascent / units_per_em) * font_size * 0.3528
-            font.close()
-        else:
-            # Fallback to approximation if font not found
-            baseline_offset_mm = font_size * 0.3528 * 0.8
-    except:
-        # Fallback to approximation if fonttools fails
-        baseline_offset_mm = font_size * 0.3528 * 0.8
-
-    # Calculate vertical start for first line baseline
-    if align_v == 'bottom':
-        first_baseline_y = y + h - total_text_h + baseline_offset_mm
-    elif align_v == 'center':
-        first_baseline_y = y + (h - total_text_h) / 2 + baseline_offset_mm
-    else:  # top
-        first_baseline_y = y + baseline_offset_mm
-
-    try:
-        p = c.beginPath()
-
-        for i, line in enumerate(lines):
-            if not line:
-                continue
-            baseline_y = first_baseline_y + i * line_height_mm
-
-            # Adjust X for horizontal alignment per line
-            if align_h == 'center':
-                text_w = get_text_width(line, font_family, font_size)
-                start_x = x + (w - text_w) / 2
-            elif align_h == 'right':
-                text_w = get_text_width(line, font_family, font_size)
-                start_x = x + w - text_w
-            else:
-                start_x = x
-
-            path_ops = text_to_path(line, font_family, font_size, start_x, baseline_y)
-
-            for op in path_ops:
-                o = op.get('o')
-                a = op.get('a', [])
-
-                if o == 'M' and len(a) >= 2:
-                    p.moveTo(a[0] * mm, page_h - (a[1] * mm))
-                elif o == 'L' and len(a) >= 2:
-                    p.lineTo(a[0] * mm, page_h - (a[1] * mm))
-                elif o == 'C' and len(a) >= 6:
-                    p.curveTo(
-                        a[0] * mm, page_h - (a[1] * mm),
-                        a[2] * mm, page_h - (a[3] * mm),
-                        a[4] * mm, page_h - (a[5] * mm)
-                    )
-                elif o == 'Z':
-                    p.close()
-
-        r, g, b = _hex_to_rgb(color)
-        c.setFillColorRGB(r, g, b)
-        c.drawPath(p, fill=1, stroke=0, fillMode=0)  # even-odd fill for correct winding
-
-    except Exception as e:
-        # Fallback to regular text if outlining fails
-        print(f"Warning: Text outlining failed, using regular text: {e}")
-        _draw_text(c, comp, page_h)
-
-def _register_custom_font(c, font_family, font_id=None, font_style=''):
-    """
-    Register custom font with ReportLab if available
-    Returns: (font_name, is_custom) tuple
-    """
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-
-    # Check if font is uploaded
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-    from models.font import Font
-
-    def _normalize_font_name(name):
-        if not name:
-            return ''
-        return re.sub(r'[\s\-_]+', '', str(name).lower())
-
-    def _find_uploaded_font_by_name(font_name):
-        if not font_name:
-            return None
-
-        # Exact lookup first
-        exact = Font.get_by_name(font_name)
-        if exact:
-            return exact
-
-        # Normalized lookup fallback
-        target = _normalize_font_name(font_name)
-        if not target:
-            return None
-
-        for f in Font.get_all():
-            n = _normalize_font_name(f.get('font_name', ''))
-            if n and n == target:
-                return f
-        return None
-
-    def _build_font_name_candidates(family, style):
-        candidates = []
-        fam = (family or '').strip()
-        sty = (style or '').strip()
-        if fam and sty and sty.lower() != 'regular':
-            candidates.append(f"{fam} {sty}")
-            candidates.append(f"{fam}-{sty}")
-            candidates.append(f"{fam}{sty}")
-        if fam:
-            candidates.append(fam)
-        # Deduplicate while preserving order
-        uniq = []
-        seen = set()
-        for c in candidates:
-            key = _normalize_font_name(c)
-            if key and key not in seen:
-                seen.add(key)
-                uniq.append(c)
-        return uniq
-
-    try:
-        uploaded_font = None
-
-        # Try by ID first (most reliable)
-        if font_id:
-            uploaded_font = Font.get_by_id(int(font_id))
-
-        # Fallback to robust name lookup (include style variants)
-        if not uploaded_font and font_family:
-            for candidate in _build_font_name_candidates(font_family, font_style):
-                uploaded_font = _find_uploaded_font_by_name(candidate)
-                if uploaded_font:
-                    break
-
-        if uploaded_font:
-            file_path = uploaded_font['file_path']
-            # Ensure absolute path
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(os.path.dirname(__file__), '..', file_path)
-            file_path = os.path.normpath(file_path)
-            # ReportLab needs forward slashes on Windows
-            file_path = file_path.replace('\\', '/')
-
-            if os.path.exists(file_path):
-                # Read font's full name from font file for Illustrator compatibility
-                reg_name = uploaded_font['font_name'] or font_family
-                try:
-                    from fontTools.ttLib import TTFont as FTFont
-                    ft_font = FTFont(file_path)
-                    full_name = None
-                    ps_name = None
-                    for record in ft_font['name'].names:
-                        if record.nameID == 4 and record.platformID == 3:  # Full name (Windows)
-                            try:
-                                full_name = record.toUnicode()
-                            except:
-                                pass
-                        elif record.nameID == 6 and record.platformID == 3:  # PostScript name
-                            try:
-                                ps_name = record.toUnicode()
-                            except:
-                                pass
-                    ft_font.close()
-                    # Prefer full name (matches local installed font), fallback to PostScript name
-                    if full_name:
-                        reg_name = full_name
-                    elif ps_name:
-                        reg_name = ps_name
-                except Exception as e:
-                    print(f"Warning: Could not read font name: {e}")
-
-                # Check if already registered
-                try:
-                    pdfmetrics.getFont(reg_name)
-                    return (reg_name, True)
-                except:
-                    pass
-
-                # Register TTF with ReportLab
-                try:
-                    font = TTFont(reg_name, file_path)
-                    font.substitutionFonts = []
-                    pdfmetrics.registerFont(font)
-                    print(f"Font registered: {reg_name} from {file_path}")
-                    return (reg_name, True)
-                except Exception as e:
-                    print(f"Warning: Could not register font {reg_name}: {e}")
-            else:
-                print(f"Warning: Font file not found: {file_path}")
-    except Exception as e:
-        print(f"Warning: Could not check uploaded fonts: {e}")
-
-    # Prefer preserving the requested font name so Illustrator can resolve/missing-font prompt
-    if font_family:
-        try:
-            from reportlab.pdfbase.pdfmetrics import Font as RLFont
-            # Register an alias with requested name backed by Helvetica metrics for PDF generation
-            try:
-                pdfmetrics.getFont(font_family)
-            except:
-                pdfmetrics.registerFont(RLFont(font_family, 'Helvetica', 'WinAnsiEncoding'))
-            return (font_family, False)
-        except Exception:
-            pass
-
-    # Final fallback to standard fonts
-    font_map = {
-        'Arial': 'Helvetica',
-        'Times New Roman': 'Times-Roman',
-        'Courier New': 'Courier'
-    }
-    return (font_map.get(font_family, 'Helvetica'), False)
-
-def _hex_to_rgb(hex_color):
-    """Convert hex color string to RGB tuple (0-1 range)"""
-    hex_color = hex_color.lstrip('#')
-    if len(hex_color) != 6:
-        return (0, 0, 0)
-    r = int(hex_color[0:2], 16) / 255.0
-    g = int(hex_color[2:4], 16) / 255.0
-    b = int(hex_color[4:6], 16) / 255.0
-    return (r, g, b)
-
-def _draw_text_with_spacing(c, content, x, y, w, font_size, letter_spacing, align_h, font_name):
-    """Draw text character by character with letter spacing"""
-    # Calculate total width with spacing
-    chars = list(content)
-    char_widths = []
-    for ch in chars:
-        char_widths.append(c.stringWidth(ch, font_name, font_size))
-    total_w = sum(char_widths) + letter_spacing * mm * (len(chars) - 1) if chars else 0
-
-    # Calculate starting x based on alignment
-    if align_h == 'center':
-        cx = x + (w - total_w) / 2
-    elif align_h == 'right':
-        cx = x + w - total_w
-    else:
-        cx = x
-
-    # Draw each character
-    for i, ch in enumerate(chars):
-        c.drawString(cx, y, ch)
-        cx += char_widths[i] + letter_spacing * mm
+    with rendering(profile):
+        draw_pages(c, pages_data, lambda c, data, key: _draw_page(c, data, outlined, key))
+        _save_with_fonts(c, outlined, filepath)
+    finalize(filepath, profile)
+    return artifacts.commit(filepath)
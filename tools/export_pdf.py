@@ -1,278 +1,129 @@
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import mm
-from reportlab.graphics import renderPDF
-from reportlab.graphics.shapes import Drawing, Path
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from concurrent.futures import ProcessPoolExecutor
+import math
+import multiprocessing
 import os
-import sys
-import tempfile
 
-def export_pdf(data):
+from artifact_store import artifacts
+from display_list import draw_pages, get_display_list, page_copies, refresh_fonts, replay
+from output_profile import finalize, rendering
+
+# Parallel batch export: at least this many payloads per worker process,
+# otherwise process start-up costs more than it saves
+PARALLEL_MIN_PAGES_PER_CHUNK = 50
+
+
+def export_pdf(data, profile=None):
     """
     Generate PDF from component data
 
     Args:
-        data: dict with 'label' (width, height) and 'components' array
+        data: dict with 'label' (width, height) and 'components' array,
+              optional 'boundsRects' and 'copies'
+        profile: output profile name, dict or OutputProfile (see output_profile)
 
     Returns:
         str: Path to generated PDF file
     """
-    label = data.get('label', {})
-    components = data.get('components', [])
+    if page_copies(data) > 1:
+        return export_pdf_batch([data], profile=profile)
 
+    label = data.get('label', {})
     page_w = label.get('width', 100) * mm
     page_h = label.get('height', 100) * mm
 
-    # Create temporary file
-    fd, filepath = tempfile.mkstemp(suffix='.pdf', dir='.tmp')
-    os.close(fd)
+    # Written under a staging name, committed to the artifact store when complete
+    filepath = artifacts.stage('.pdf')
 
     # Create PDF canvas
     c = canvas.Canvas(filepath, pagesize=(page_w, page_h))
+    refresh_fonts()
+    with rendering(profile):
+        _draw_page(c, data)
+        c.save()
+    finalize(filepath, profile)
+    return artifacts.commit(filepath)
 
-    # Draw each component
-    for comp in components:
-        comp_type = comp.get('type')
-        x = comp.get('x', 0) * mm
-        y = page_h - (comp.get('y', 0) * mm)  # Flip Y-axis
-        width = comp.get('width', 0) * mm
-        height = comp.get('height', 0) * mm
-
-        if comp_type == 'pdfpath':
-            _draw_pdfpath(c, comp, page_h)
-        elif comp_type in ('text', 'textregion'):
-            _draw_text(c, comp, page_h)
-        elif comp_type in ('barcoderegion', 'qrcoderegion'):
-            _draw_barcode_or_qr(c, comp, page_h)
-
-    c.save()
-    return filepath
-
-def _draw_pdfpath(c, comp, page_h):
-    """Draw PDF path component"""
-    path_data = comp.get('pathData', {})
-    ops = path_data.get('ops', [])
-    fill = path_data.get('fill')
-    stroke = path_data.get('stroke')
-    lw = path_data.get('lw', 0.5)
-    if not ops:
-        return
-
-    # Create path
-    p = c.beginPath()
-
-    sub_path_open = False
-    for op in ops:
-        o = op.get('o')
-        a = op.get('a', [])
-
-        if o == 'M' and len(a) >= 2:
-            if sub_path_open:
-                p.close()
-            p.moveTo(a[0] * mm, page_h - (a[1] * mm))
-            sub_path_open = True
-        elif o == 'L' and len(a) >= 2:
-            p.lineTo(a[0] * mm, page_h - (a[1] * mm))
-        elif o == 'C' and len(a) >= 6:
-            p.curveTo(
-                a[0] * mm, page_h - (a[1] * mm),
-                a[2] * mm, page_h - (a[3] * mm),
-                a[4] * mm, page_h - (a[5] * mm)
-            )
-        elif o == 'Z':
-            p.close()
-            sub_path_open = False
-
-    if sub_path_open:
-        p.close()
-
-    # Set colors
-    if fill:
-        c.setFillColorRGB(fill[0], fill[1], fill[2])
-
-    if stroke:
-        c.setStrokeColorRGB(stroke[0], stroke[1], stroke[2])
-        c.setLineWidth(lw * mm)
-
-    # Use the original fill rule from the PDF (even-odd vs non-zero winding)
-    fill_mode = 0 if comp.get('isEvenOdd', False) else None
-    if fill and stroke:
-        c.drawPath(p, fill=1, stroke=1, fillMode=fill_mode)
-    elif fill:
-        c.drawPath(p, fill=1, stroke=0, fillMode=fill_mode)
-    elif stroke:
-        c.drawPath(p, fill=0, stroke=1)
 
-def _draw_text(c, comp, page_h):
-    """Draw text component with alignment, multi-line, custom fonts"""
-    content = comp.get('content', '')
-    if not content:
-        return
+def export_pdf_batch(pages_data, workers=None, profile=None):
+    """Generate a multi-page PDF with the same page semantics as export_ai_batch.
 
-    x = comp.get('x', 0) * mm
-    w = comp.get('width', 0) * mm
-    h = comp.get('height', 0) * mm
-    font_family = comp.get('fontFamily', 'Helvetica')
-    font_size = comp.get('fontSize', 12)
-    font_id = comp.get('fontId', None)
-    color = comp.get('color', '#000000')
-    letter_spacing = comp.get('letterSpacing', 0)
-    align_h = comp.get('alignH', 'left')
-    align_v = comp.get('alignV', 'top')
-
-    # Register custom font if available
-    resolved_font = _register_custom_font(font_family, font_id)
-    c.setFont(resolved_font, font_size)
-
-    # Parse hex color
-    r, g, b = _hex_to_rgb(color)
-    c.setFillColorRGB(r, g, b)
-
-    # Multi-line support
-    lines = content.split('\n')
-    line_height = font_size * 1.2 + letter_spacing
-    total_text_h = len(lines) * line_height
-    comp_y = comp.get('y', 0) * mm
-
-    # Vertical alignment
-    if align_v == 'bottom':
-        first_line_y = page_h - comp_y - h + (total_text_h - line_height) + (font_size * 0.2)
-    elif align_v == 'center':
-        first_line_y = page_h - comp_y - (h / 2) - (total_text_h / 2) + (font_size * 0.2) + (total_text_h - line_height)
-    else:  # top
-        first_line_y = page_h - comp_y - (font_size * 0.8)
-
-    for i, line in enumerate(lines):
-        y = first_line_y - (i * line_height)
-        if not line:
-            continue
-        if align_h == 'center':
-            c.drawCentredString(x + w / 2, y, line)
-        elif align_h == 'right':
-            c.drawRightString(x + w, y, line)
-        else:
-            c.drawString(x, y, line)
-
-
-def _draw_barcode_or_qr(c, comp, page_h):
-    """Draw barcode or QR code as vector paths"""
-    comp_type = comp.get('type')
-    x = comp.get('x', 0) * mm
-    w = comp.get('width', 0) * mm
-    h = comp.get('height', 0) * mm
-    comp_y = comp.get('y', 0) * mm
-    y = page_h - comp_y - h
-    color_hex = comp.get('color', '#000000')
-    fr, fg, fb = _hex_to_rgb(color_hex)
+    Each item in pages_data is a single-page payload; its optional 'copies'
+    emits that many pages sharing one Form XObject. With workers > 1, large
+    batches are split into chunks rendered in separate processes and merged
+    in order (needs pypdf).
+    """
+    if not pages_data:
+        raise ValueError("No pages to export")
 
-    if comp_type == 'qrcoderegion':
-        qr_data = comp.get('qrData', '')
-        if not qr_data:
-            return
-        try:
-            import qrcode
-            qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=1, border=0)
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            mc = qr.modules_count
-            cw = w / mc
-            ch = h / mc
-            c.setFillColorRGB(1, 1, 1)
-            c.rect(x, y, w, h, fill=1, stroke=0)
-            c.setFillColorRGB(fr, fg, fb)
-            for row in range(mc):
-                for col in range(mc):
-                    if qr.modules[row][col]:
-                        rx = x + col * cw
-                        ry = y + h - (row + 1) * ch
-                        c.rect(rx, ry, cw, ch, fill=1, stroke=0)
-        except Exception as e:
-            print(f"Warning: Could not render QR code: {e}")
+    filepath = artifacts.stage('.pdf')
 
-    elif comp_type == 'barcoderegion':
-        barcode_data = comp.get('barcodeData', '')
-        barcode_format = comp.get('barcodeFormat', 'code128')
-        if not barcode_data:
-            return
+    chunks = _chunk_pages(pages_data, workers)
+    if len(chunks) > 1:
         try:
-            import barcode as python_barcode
-            fmt_map = {
-                'code128': 'code128',
-                'ean13': 'ean13',
-                'code39': 'code39',
-                'upc': 'upca'
-            }
-            fmt = fmt_map.get(barcode_format, 'code128')
-            bc_class = python_barcode.get_barcode_class(fmt)
-            bc = bc_class(barcode_data)
-            encoded = bc.build()
-            if not encoded:
-                return
-            bars = ''.join(encoded)
-            num_modules = len(bars)
-            if num_modules == 0:
-                return
-            bar_w = w / num_modules
-            c.setFillColorRGB(1, 1, 1)
-            c.rect(x, y, w, h, fill=1, stroke=0)
-            c.setFillColorRGB(fr, fg, fb)
-            for i, bit in enumerate(bars):
-                if bit == '1':
-                    c.rect(x + i * bar_w, y, bar_w, h, fill=1, stroke=0)
-        except Exception as e:
-            print(f"Warning: Could not render barcode: {e}")
-
-
-def _register_custom_font(font_family, font_id=None):
-    """Register custom font if available, return resolved font name"""
-    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-    from models.font import Font
-
+            from pypdf import PdfWriter
+        except ImportError:
+            print("Warning: pypdf not installed, rendering PDF batch in a single process")
+            chunks = [pages_data]
+    if len(chunks) == 1:
+        _render_pages(pages_data, filepath, profile)
+        finalize(filepath, profile)
+        return artifacts.commit(filepath)
+
+    chunk_paths = []
     try:
-        uploaded_font = None
-        if font_id:
-            uploaded_font = Font.get_by_id(int(font_id))
-        if not uploaded_font and font_family:
-            uploaded_font = Font.get_by_name(font_family)
-
-        if uploaded_font:
-            file_path = uploaded_font['file_path']
-            if not os.path.isabs(file_path):
-                file_path = os.path.join(os.path.dirname(__file__), '..', file_path)
-            file_path = os.path.normpath(file_path).replace('\\', '/')
-
-            if os.path.exists(file_path):
-                reg_name = uploaded_font['font_name'] or font_family
-                try:
-                    pdfmetrics.getFont(reg_name)
-                    return reg_name
-                except:
-                    pass
-                try:
-                    font = TTFont(reg_name, file_path)
-                    font.substitutionFonts = []
-                    pdfmetrics.registerFont(font)
-                    return reg_name
-                except Exception as e:
-                    print(f"Warning: Could not register font {reg_name}: {e}")
-    except Exception as e:
-        print(f"Warning: Could not check uploaded fonts: {e}")
-
-    font_map = {
-        'Arial': 'Helvetica',
-        'Times New Roman': 'Times-Roman',
-        'Courier New': 'Courier'
-    }
-    return font_map.get(font_family, 'Helvetica')
+        for _ in chunks:
+            chunk_paths.append(artifacts.stage('.pdf'))
+        # spawn: the web server's threads and open database connections must not be forked
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=ctx) as pool:
+            list(pool.map(_render_pages, chunks, chunk_paths, [profile] * len(chunks)))
+        writer = PdfWriter()
+        for chunk_path in chunk_paths:
+            writer.append(chunk_path)
+        with open(filepath, 'wb') as f:
+            writer.write(f)
+        finalize(filepath, profile)
+    finally:
+        for chunk_path in chunk_paths:
+            try:
+                os.unlink(chunk_path)
+            except OSError:
+                pass
+    return artifacts.commit(filepath)
+
+
+def _chunk_pages(pages_data, workers):
+    """Split payloads into at most `workers` contiguous chunks worth a process each"""
+    # More processes than cores only adds start-up and contention
+    workers = min(workers or 1, os.cpu_count() or 1)
+    if workers < 2:
+        return [pages_data]
+    count = min(workers, len(pages_data) // PARALLEL_MIN_PAGES_PER_CHUNK)
+    if count < 2:
+        return [pages_data]
+    size = math.ceil(len(pages_data) / count)
+    return [pages_data[i:i + size] for i in range(0, len(pages_data), size)]
+
+
+def _render_pages(pages_data, filepath, profile=None):
+    """Render payloads to filepath; content used on several pages is drawn once as a form"""
+    refresh_fonts()
+    with rendering(profile):
+        _render_canvas(pages_data, filepath)
+
+
+def _render_canvas(pages_data, filepath):
+    """Draw every page of the batch and save the canvas"""
+    first_label = pages_data[0].get('label', {})
+    c = canvas.Canvas(filepath, pagesize=(first_label.get('width', 100) * mm,
+                                          first_label.get('height', 100) * mm))
+
+    draw_pages(c, pages_data, _draw_page)
+    c.save()
 
 
-def _hex_to_rgb(hex_color):
-    """Convert hex color string to RGB tuple (0-1 range)"""
-    hex_color = hex_color.lstrip('#')
-    if len(hex_color) != 6:
-        return (0, 0, 0)
-    r = int(hex_color[0:2], 16) / 255.0
-    g = int(hex_color[2:4], 16) / 255.0
-    b = int(hex_color[4:6], 16) / 255.0
-    return (r, g, b)
+def _draw_page(c, data, content_key=None):
+    """Draw every component of one page"""
+    replay(c, get_display_list(data, 'pdf', content_key=content_key))
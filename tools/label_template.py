@@ -0,0 +1,197 @@
+"""Precompiled variable-data label templates for high-volume order exports.
+
+A layout version is compiled once per (flavor, outlined, fonts): its static
+artwork is drawn into Form XObjects and each variable overlay becomes a
+slot. Rendering an order line then only compiles that line's slot values
+(text, barcode or QR) and references the forms, so flattening, font
+resolution and path emission are not repeated per label.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from artifact_store import artifacts
+from display_list import (begin_page_form, compile_component, compile_page,
+                          fonts_fingerprint, refresh_fonts, replay_ops)
+from output_profile import finalize, rendering
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models.layout import Layout
+from tools.flatten_tree import flatten_layout_for_export
+
+# Compiled templates kept per process (layout versions in use at once)
+MAX_TEMPLATES = 64
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+
+
+class LabelTemplate:
+    """A layout version compiled into static segments and variable slots"""
+
+    def __init__(self, layout_data, flavor, outlined=False):
+        self.flavor = flavor
+        self.outlined = outlined
+        payload = flatten_layout_for_export(layout_data)
+        if flavor == 'ai':
+            payload['separateInvisible'] = True
+
+        # Visible overlays are the trailing components, in overlay order;
+        # a slot is numbered by its overlay index (the variable_values key)
+        visible = [idx for idx, ov in enumerate(layout_data.get('overlays', []))
+                   if ov.get('visible') != False]
+        components = payload['components']
+        overlay_comps = components[len(components) - len(visible):] if visible else []
+        self.slots = {}
+        slot_ids = {}
+        for idx, comp in zip(visible, overlay_comps):
+            if comp.get('isVariable'):
+                self.slots[idx] = comp
+                slot_ids[id(comp)] = idx
+
+        display_list = compile_page(payload, flavor, outlined, slot_of=lambda comp: slot_ids.get(id(comp)))
+        # ('static', ops) and ('slot', number) in draw order
+        self.segments = []
+        ops = []
+        for layer in display_list['layers']:
+            for op in layer['ops']:
+                if op[0] == 'slot':
+                    if ops:
+                        self.segments.append(('static', ops))
+                        ops = []
+                    self.segments.append(op)
+                else:
+                    ops.append(op)
+        if ops:
+            self.segments.append(('static', ops))
+
+        label = payload['label']
+        self.page_size = ((label.get('width') or 100) * mm, (label.get('height') or 100) * mm)
+        self._page = {'label': label, 'boundsRects': payload['boundsRects']}
+
+    def define_forms(self, c, prefix):
+        """Draw each static segment into a form on canvas c; returns the form names"""
+        pw, ph = self.page_size
+        names = {}
+        for i, (kind, ops) in enumerate(self.segments):
+            if kind != 'static':
+                continue
+            names[i] = f'{prefix}_{i}'
+            begin_page_form(c, names[i], pw, ph)
+            replay_ops(c, ops)
+            c.endForm()
+        return names
+
+    def draw(self, c, form_names, variable_values):
+        """Draw one label: the static forms with the slots filled from variable_values"""
+        for i, (kind, value) in enumerate(self.segments):
+            if kind == 'static':
+                c.doForm(form_names[i])
+            else:
+                replay_ops(c, self.slot_ops(value, variable_values.get(str(value))))
+
+    def slot_ops(self, slot, value):
+        """Display list ops of a slot's component holding value (None keeps the default)"""
+        comp = self.slots[slot]
+        if value is not None:
+            comp = dict(comp, content=value)
+            if comp.get('type') == 'qrcoderegion':
+                comp['qrData'] = value
+            elif comp.get('type') == 'barcoderegion':
+                comp['barcodeData'] = value
+        return compile_component(self._page, comp, self.flavor, self.outlined)
+
+
+def get_template(version_hash, flavor, outlined=False):
+    """Compiled template of a layout version, or None if the version doesn't exist.
+
+    Call refresh_fonts() first: templates are keyed by the fonts they were
+    compiled against.
+    """
+    key = (version_hash, flavor, bool(outlined), fonts_fingerprint())
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+    data = Layout.load_version(version_hash) if version_hash else None
+    if not isinstance(data, dict):
+        return None
+    template = LabelTemplate(data, flavor, outlined)
+    with _templates_lock:
+        _templates[key] = template
+        while len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    return template
+
+
+def render_labels(c, jobs):
+    """Draw (template, variable_values, copies) jobs onto canvas c, one page per copy"""
+    forms = {}
+    line_forms = 0
+    for template, variable_values, copies in jobs:
+        names = forms.get(id(template))
+        if names is None:
+            names = forms[id(template)] = template.define_forms(c, f'tpl{len(forms)}')
+        c.setPageSize(template.page_size)
+        if copies > 1:
+            # Copies of a line share one form holding its filled label
+            name = f'line{line_forms}'
+            line_forms += 1
+            begin_page_form(c, name, *template.page_size)
+            template.draw(c, names, variable_values)
+            c.endForm()
+            for _ in range(copies):
+                c.setPageSize(template.page_size)
+                c.doForm(name)
+                c.showPage()
+        else:
+            template.draw(c, names, variable_values)
+            c.showPage()
+
+
+def export_order_labels(lines, flavor='pdf', outlined=False, profile=None):
+    """Render order lines into one PDF or AI file through their layouts' templates.
+
+    lines: dicts with layout_version, variable_values (dict) and quantity,
+    e.g. from Order.get_export_lines(). Lines whose layout version no longer
+    exists are skipped.
+
+    Returns:
+        str: Path to the generated file
+    """
+    refresh_fonts()
+    jobs = []
+    for line in lines:
+        template = get_template(line.get('layout_version'), flavor, outlined)
+        if template is None:
+            print(f"Warning: Layout version {line.get('layout_version')} not found, skipping line")
+            continue
+        jobs.append((template, line.get('variable_values') or {}, _copies(line.get('quantity'))))
+    if not jobs:
+        raise ValueError("No pages to export")
+
+    filepath = artifacts.stage('.ai' if flavor == 'ai' else '.pdf')
+
+    c = canvas.Canvas(filepath, pagesize=jobs[0][0].page_size)
+    with rendering(profile):
+        render_labels(c, jobs)
+        if flavor == 'ai':
+            from export_ai import _save_with_fonts
+            _save_with_fonts(c, outlined, filepath)
+        else:
+            c.save()
+    finalize(filepath, profile)
+    return artifacts.commit(filepath)
+
+
+def _copies(quantity):
+    """Pages a line should produce (its quantity, at least 1)"""
+    try:
+        return max(1, int(quantity or 1))
+    except (TypeError, ValueError):
+        return 1
@@ -0,0 +1,239 @@
+"""Output profiles for exported PDF/AI files: coordinate precision, compression level, object streams."""
+import io
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+
+# name, precision (pt, None = ReportLab's 6 significant digits),
+# compression_level (zlib 0-9, None = zlib default), object_streams (bool)
+OutputProfile = namedtuple('OutputProfile', 'name precision compression_level object_streams')
+
+OUTPUT_PROFILES = {
+    'default': OutputProfile('default', None, None, False),
+    'compact': OutputProfile('compact', 0.001, 9, True),
+}
+
+# Non-stream objects packed into each object stream
+OBJECTS_PER_STREAM = 200
+
+_local = threading.local()
+_installed = False
+_install_lock = threading.Lock()
+
+
+def resolve_profile(spec):
+    """Build an OutputProfile from a request value.
+
+    spec is None, a profile name ('default', 'compact') or a dict with an
+    optional 'base' profile name overridden by 'precision',
+    'compressionLevel' and 'objectStreams'. Raises ValueError when invalid.
+    """
+    if isinstance(spec, OutputProfile):
+        return spec
+    if spec is None or spec == '':
+        return OUTPUT_PROFILES['default']
+    if isinstance(spec, str):
+        if spec not in OUTPUT_PROFILES:
+            raise ValueError(f"Unknown output profile '{spec}' (expected one of: {', '.join(OUTPUT_PROFILES)})")
+        return OUTPUT_PROFILES[spec]
+    if not isinstance(spec, dict):
+        raise ValueError('outputProfile must be a profile name or an object')
+
+    base = resolve_profile(spec.get('base') or 'default')
+    precision = spec.get('precision', base.precision)
+    if precision is not None:
+        try:
+            precision = float(precision)
+        except (TypeError, ValueError):
+            raise ValueError('precision must be a number of points')
+        if not 0.000001 <= precision <= 1:
+            raise ValueError('precision must be between 0.000001 and 1 pt')
+    level = spec.get('compressionLevel', base.compression_level)
+    if level is not None:
+        if isinstance(level, bool) or not isinstance(level, int) or not 0 <= level <= 9:
+            raise ValueError('compressionLevel must be an integer from 0 to 9')
+    object_streams = bool(spec.get('objectStreams', base.object_streams))
+    return OutputProfile('custom', precision, level, object_streams)
+
+
+@contextmanager
+def rendering(profile):
+    """Apply a profile's precision and compression level to ReportLab output in this thread.
+
+    Wrap both the drawing calls and canvas.save(): coordinates are formatted
+    as they are drawn, streams are compressed on save.
+    """
+    profile = resolve_profile(profile)
+    _install()
+    previous = (getattr(_local, 'precision', None), getattr(_local, 'fmt', None),
+                getattr(_local, 'level', None))
+    _local.precision = profile.precision
+    _local.fmt = f'%.{_decimals(profile.precision)}f' if profile.precision else None
+    _local.level = profile.compression_level
+    try:
+        yield profile
+    finally:
+        _local.precision, _local.fmt, _local.level = previous
+
+
+def finalize(filepath, profile):
+    """Post-process a saved file for the profile (object and cross-reference streams)"""
+    profile = resolve_profile(profile)
+    if not profile.object_streams:
+        return
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        print("Warning: pypdf not installed, writing PDF without object streams")
+        return
+    write_object_streams(filepath, profile.compression_level)
+
+
+def write_object_streams(filepath, compression_level=None):
+    """Rewrite a PDF as 1.5 with its non-stream objects in object streams and a cross-reference stream.
+
+    Object numbers are kept, so references inside the objects stay valid.
+    The file is replaced atomically.
+    """
+    from pypdf import PdfReader
+    from pypdf.generic import (ArrayObject, DictionaryObject, NameObject,
+                               NumberObject, StreamObject)
+
+    level = -1 if compression_level is None else compression_level
+    reader = PdfReader(filepath)
+    if reader.is_encrypted:
+        print("Warning: encrypted PDF, skipping object streams")
+        return
+
+    numbers = sorted(set(reader.xref.get(0, {})) | set(reader.xref_objStm))
+    out = io.BytesIO()
+    out.write(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+    # object number -> (type, field 2, field 3) of its cross-reference stream row
+    entries = {}
+    packed = []
+    for num in numbers:
+        obj = reader.get_object(num)
+        if obj is None:
+            continue
+        if isinstance(obj, StreamObject):
+            entries[num] = (1, out.tell(), 0)
+            out.write(f'{num} 0 obj\n'.encode())
+            obj.write_to_stream(out)
+            out.write(b'\nendobj\n')
+        else:
+            packed.append((num, obj))
+
+    next_num = max(numbers + [int(reader.trailer.get('/Size', 1)) - 1]) + 1
+    for start in range(0, len(packed), OBJECTS_PER_STREAM):
+        group = packed[start:start + OBJECTS_PER_STREAM]
+        stream_num = next_num
+        next_num += 1
+        offsets = []
+        body = io.BytesIO()
+        for index, (num, obj) in enumerate(group):
+            offsets.append(f'{num} {body.tell()}')
+            obj.write_to_stream(body)
+            body.write(b'\n')
+            entries[num] = (2, stream_num, index)
+        header = (' '.join(offsets) + '\n').encode()
+        data = zlib.compress(header + body.getvalue(), level)
+        entries[stream_num] = (1, out.tell(), 0)
+        out.write(f'{stream_num} 0 obj\n<< /Type /ObjStm /N {len(group)} /First {len(header)} '
+                  f'/Filter /FlateDecode /Length {len(data)} >>\nstream\n'.encode())
+        out.write(data)
+        out.write(b'\nendstream\nendobj\n')
+
+    xref_num = next_num
+    size = xref_num + 1
+    xref_offset = out.tell()
+    entries[0] = (0, 0, 65535)
+    entries[xref_num] = (1, xref_offset, 0)
+    rows = b''.join(struct.pack('>BIH', *entries.get(num, (0, 0, 0))) for num in range(size))
+    data = zlib.compress(rows, level)
+
+    trailer = DictionaryObject()
+    for key in ('/Root', '/Info', '/ID'):
+        if key in reader.trailer:
+            trailer[NameObject(key)] = reader.trailer.raw_get(key)
+    trailer[NameObject('/Type')] = NameObject('/XRef')
+    trailer[NameObject('/Size')] = NumberObject(size)
+    trailer[NameObject('/W')] = ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)])
+    trailer[NameObject('/Filter')] = NameObject('/FlateDecode')
+    trailer[NameObject('/Length')] = NumberObject(len(data))
+    out.write(f'{xref_num} 0 obj\n'.encode())
+    trailer.write_to_stream(out)
+    out.write(b'\nstream\n')
+    out.write(data)
+    out.write(f'\nendstream\nendobj\nstartxref\n{xref_offset}\n%%EOF\n'.encode())
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.pdf', dir=os.path.dirname(os.path.abspath(filepath)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(out.getvalue())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _decimals(precision):
+    """Decimal places needed to print multiples of precision exactly (at most 6)"""
+    text = f'{precision:.6f}'.rstrip('0')
+    return min(len(text.split('.')[1]), 6)
+
+
+def _install():
+    """Route ReportLab number formatting and stream compression through this module (once).
+
+    The replacements defer to ReportLab unchanged unless a profile is active
+    in the calling thread, so concurrent default exports are unaffected.
+    """
+    global _installed
+    if _installed:
+        return
+    with _install_lock:
+        if _installed:
+            return
+        from reportlab.lib import rl_accel
+        from reportlab.pdfbase import pdfdoc
+        from reportlab.pdfgen import canvas, pathobject, textobject
+
+        rl_fp_str = rl_accel.fp_str
+
+        def fp_str(*a):
+            precision = getattr(_local, 'precision', None)
+            if not precision:
+                return rl_fp_str(*a)
+            if len(a) == 1 and isinstance(a[0], (list, tuple)):
+                a = a[0]
+            parts = []
+            for value in a:
+                if abs(value) <= 1:
+                    # Matrix, colour and scale factors keep full precision:
+                    # a rounded cos/sin would move every point it transforms
+                    parts.append(rl_fp_str(value))
+                    continue
+                text = _local.fmt % (round(value / precision) * precision)
+                if '.' in text:
+                    text = text.rstrip('0').rstrip('.')
+                parts.append(text)
+            return ' '.join(parts)
+
+        for module in (canvas, pathobject, textobject, pdfdoc):
+            module.fp_str = fp_str
+
+        def encode(self, text):
+            if isinstance(text, str):
+                text = text.encode('utf8')
+            level = getattr(_local, 'level', None)
+            return zlib.compress(text, -1 if level is None else level)
+
+        pdfdoc.PDFStreamFilterZCompress.encode = encode
+        _installed = True
@@ -0,0 +1,70 @@
+"""Stress test order ID allocation with several processes creating orders at once.
+
+Usage: python tools/stress_order_ids.py [processes] [orders_per_process]
+Runs against a throwaway database in .tmp/, never the real database.db.
+Exits non-zero if any create failed or the IDs are not unique and contiguous.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models import database
+
+
+def _worker(args):
+    path, count = args
+    database.DATABASE_PATH = path
+    from models.order import Order
+    created, errors = [], []
+    for i in range(count):
+        try:
+            created.append(Order.create('CUST-STRESS', f'PO-{os.getpid()}-{i}'))
+        except Exception as e:
+            errors.append(str(e))
+    return created, errors
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_process = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    tmp_dir = os.path.join(os.path.dirname(__file__), '..', '.tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.db', dir=tmp_dir)
+    os.close(fd)
+    database.close_db()
+    database.DATABASE_PATH = path
+    try:
+        database.init_db()
+        database.close_all_connections()
+
+        t0 = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_worker, [(path, per_process)] * processes)
+        elapsed = time.perf_counter() - t0
+
+        ids = [order_id for created, _ in results for order_id in created]
+        errors = [err for _, errs in results for err in errs]
+        expected = [f"ORD-{n:05d}" for n in range(1, processes * per_process + 1)]
+
+        print(f"{processes} processes x {per_process} creates in {elapsed:.2f}s "
+              f"({len(ids) / elapsed:.0f} orders/s)")
+        print(f"  created: {len(ids)}  unique: {len(set(ids))}  errors: {len(errors)}")
+        if errors:
+            print(f"  first error: {errors[0]}")
+        ok = not errors and sorted(ids) == expected
+        print("  OK: IDs unique and contiguous" if ok else "  FAIL")
+        return 0 if ok else 1
+    finally:
+        database.close_all_connections()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.unlink(path + suffix)
+            except OSError:
+                pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
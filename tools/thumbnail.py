@@ -0,0 +1,186 @@
+"""SVG thumbnails of layout versions, rendered once from the flattened components.
+
+A thumbnail is the layout's 'pdf' display list replayed as SVG, with
+coordinates rounded to 0.1 pt. Thumbnails live in an artifact store keyed
+by version hash: versions are immutable, so a file never goes stale, and
+the store's size cap evicts the least recently viewed. Saving a layout
+queues its new version for rendering in a background thread.
+"""
+import os
+import queue
+import re
+import sys
+import threading
+from xml.sax.saxutils import escape, quoteattr
+
+from reportlab.lib.units import mm
+
+from artifact_store import ArtifactStore
+from display_list import compile_page, refresh_fonts
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from models.layout import Layout
+from tools.flatten_tree import flatten_layout_for_export
+
+THUMBNAIL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.thumbnails')
+
+# Evicted thumbnails are simply rendered again on their next request
+THUMBNAIL_MAX_BYTES = 256 * 1024 * 1024
+
+thumbnails = ArtifactStore(THUMBNAIL_DIR, THUMBNAIL_MAX_BYTES)
+
+# Displayed width in CSS pixels (the SVG scales; this only sets its default size)
+THUMBNAIL_WIDTH = 240
+
+_VERSION_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# SVG families for the fonts ReportLab falls back to
+_GENERIC_FAMILIES = {
+    'Helvetica': 'Helvetica, Arial, sans-serif',
+    'Times': "'Times New Roman', Times, serif",
+    'Courier': "'Courier New', Courier, monospace",
+}
+
+_queue = queue.Queue()
+_pending = set()
+_pending_lock = threading.Lock()
+_worker = None
+
+
+def is_version_hash(value):
+    """True if value looks like a layout version hash (safe to use in a file name)"""
+    return bool(value) and bool(_VERSION_RE.match(value))
+
+
+def get_thumbnail(version_hash):
+    """Path of a version's thumbnail, rendering it now if needed; None if the version doesn't exist"""
+    if not is_version_hash(version_hash):
+        return None
+    path = thumbnails.lookup(version_hash, '.svg')
+    if path:
+        return path
+    data = Layout.load_version(version_hash)
+    if not isinstance(data, dict):
+        return None
+    return _save(version_hash, render_svg(data))
+
+
+def schedule(layout_id):
+    """Render the thumbnail of a layout's current version in the background"""
+    global _worker
+    with _pending_lock:
+        if layout_id in _pending:
+            return
+        _pending.add(layout_id)
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='thumbnails', daemon=True)
+            _worker.start()
+    _queue.put(layout_id)
+
+
+def _work():
+    while True:
+        layout_id = _queue.get()
+        with _pending_lock:
+            _pending.discard(layout_id)
+        try:
+            data, version_hash = Layout.load_current(layout_id)
+            if isinstance(data, dict) and not thumbnails.lookup(version_hash, '.svg'):
+                _save(version_hash, render_svg(data))
+        except Exception as e:
+            print(f"Warning: Could not render thumbnail for layout {layout_id}: {e}")
+
+
+def thumbnail_payload(layout_data):
+    """Export payload of a stored layout: JSON layouts are flattened, PDF layouts mapped"""
+    if 'components' in layout_data and 'pdfWidth' in layout_data:
+        components = []
+        for comp in layout_data.get('components') or []:
+            if comp.get('visible') == False:
+                continue
+            components.append(dict(comp, width=comp.get('w', comp.get('width', 0)),
+                                   height=comp.get('h', comp.get('height', 0))))
+        return {'label': {'width': layout_data.get('pdfWidth') or 100,
+                          'height': layout_data.get('pdfHeight') or 100},
+                'components': components}
+    return flatten_layout_for_export(layout_data)
+
+
+def render_svg(layout_data):
+    """SVG text of a layout's visible artwork"""
+    payload = thumbnail_payload(layout_data)
+    label = payload['label']
+    refresh_fonts()
+    display_list = compile_page(payload, 'pdf')
+    page_w = (label.get('width') or 100) * mm
+    page_h = (label.get('height') or 100) * mm
+
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {_num(page_w)} {_num(page_h)}" '
+           f'width="{THUMBNAIL_WIDTH}" height="{_num(THUMBNAIL_WIDTH * page_h / page_w)}">',
+           '<rect width="100%" height="100%" fill="#fff"/>',
+           # Display lists are in PDF space (y up)
+           f'<g transform="matrix(1 0 0 -1 0 {_num(page_h)})">']
+    for layer in display_list['layers']:
+        for op in layer['ops']:
+            kind = op[0]
+            if kind == 'path':
+                out.append(_svg_path(*op[1:]))
+            elif kind == 'rects':
+                _, rgb, rects = op
+                d = ''.join(f'M{_num(rects[i])} {_num(rects[i + 1])}h{_num(rects[i + 2])}'
+                            f'v{_num(rects[i + 3])}h{_num(-rects[i + 2])}z'
+                            for i in range(0, len(rects), 4))
+                out.append(f'<path d="{d}" fill="{_color(rgb)}"/>')
+            elif kind == 'text':
+                _, font_name, font_size, rgb, lines = op
+                family = quoteattr(_font_family(font_name))
+                for x, y, line in lines:
+                    out.append(f'<text transform="matrix(1 0 0 -1 {_num(x)} {_num(y)})" '
+                               f'font-family={family} font-size="{_num(font_size)}" '
+                               f'fill="{_color(rgb)}">{escape(line)}</text>')
+            elif kind == 'rotate':
+                _, cx, cy, angle = op
+                out.append(f'<g transform="rotate({_num(angle)} {_num(cx)} {_num(cy)})">')
+            elif kind == 'restore':
+                out.append('</g>')
+    out.append('</g></svg>')
+    return '\n'.join(out)
+
+
+def _svg_path(segments, fill, stroke, line_width, fill_mode, round_joins):
+    d = []
+    for seg in segments:
+        op = seg[0]
+        if op == 'h':
+            d.append('Z')
+        else:
+            d.append(op.upper() + ' '.join(_num(v) for v in seg[1:]))
+    attrs = [f'd="{"".join(d)}"', f'fill="{_color(fill) if fill else "none"}"']
+    if fill and fill_mode == 0:
+        attrs.append('fill-rule="evenodd"')
+    if stroke:
+        attrs.append(f'stroke="{_color(stroke)}" stroke-width="{_num(line_width)}"')
+    return f'<path {" ".join(attrs)}/>'
+
+
+def _num(value):
+    text = ('%.1f' % value).rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def _color(rgb):
+    return '#%02x%02x%02x' % tuple(max(0, min(255, round(v * 255))) for v in rgb[:3])
+
+
+def _font_family(font_name):
+    for prefix, family in _GENERIC_FAMILIES.items():
+        if font_name.startswith(prefix):
+            return family
+    return f"'{font_name}', sans-serif"
+
+
+def _save(version_hash, text):
+    staging = thumbnails.stage('.svg')
+    with open(staging, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return thumbnails.commit(staging, key=version_hash)